@@ -0,0 +1,67 @@
+import numpy as np
+
+MEGA = 1_000_000
+
+
+class AdaptiveGrid:
+    # starts from a coarse control voltage grid and bisects the segments
+    # where a straight line between the ends would miss the curve at the midpoint by more than the thresholds,
+    # the miss is estimated from the curvature at the segment ends and shrinks four times with every bisection
+
+    defaults = {
+        'enabled': False,
+        'coarse': 4,       # coarse step = u_vco_delta * coarse
+        'f_tol': 5.0,      # MHz, frequency interpolation error at the segment midpoint
+        'p_tol': 0.5,      # dB, power interpolation error at the segment midpoint, above the marker level jitter
+        'min_step': 0.05,  # V
+        'budget': 64,      # points per supply voltage
+    }
+
+    def __init__(self, params, u_min, u_max, u_step):
+        self._params = {**self.defaults, **(params or dict())}
+        self._u_min = u_min
+        self._u_max = u_max
+        self._u_step = u_step
+
+    @property
+    def enabled(self):
+        return self._params['enabled']
+
+    def initial(self):
+        step = self._u_step * self._params['coarse'] if self.enabled else self._u_step
+        values = [round(float(x), 4) for x in np.arange(start=self._u_min, stop=self._u_max + 0.002, step=step)]
+        if self.enabled and values[-1] < self._u_max:
+            values.append(round(self._u_max, 4))
+        return values
+
+    def refine(self, points):
+        # points -- measured (u_control, freq Hz, pow dBm) tuples of one supply voltage
+        if not self.enabled or len(points) < 3:
+            return []
+
+        budget = self._params['budget'] - len(points)
+        if budget <= 0:
+            return []
+
+        u, f, p = (np.array(col, dtype=float) for col in zip(*sorted(points)))
+
+        score = np.maximum(
+            _midpoint_error(u, f / MEGA) / self._params['f_tol'],
+            _midpoint_error(u, p) / self._params['p_tol'],
+        )
+        wide_enough = np.diff(u) / 2 >= self._params['min_step']
+        candidates = np.flatnonzero((score > 1) & wide_enough)
+
+        # worst segments first when the budget does not cover all of them
+        candidates = candidates[np.argsort(-score[candidates])][:budget]
+
+        return sorted(round(float(u[i] + u[i + 1]) / 2, 4) for i in candidates)
+
+
+def _midpoint_error(u, y):
+    # estimated error of the linear interpolation at the middle of every segment, |y''| * du^2 / 8,
+    # y'' from the slope change over the neighbouring segments, the larger one of the two ends
+    du = np.diff(u)
+    slope = np.diff(y) / du
+    curvature = np.abs(np.diff(slope)) * 2 / (u[2:] - u[:-2])
+    return np.maximum(np.r_[curvature, 0], np.r_[0, curvature]) * du ** 2 / 8
@@ -0,0 +1,71 @@
+import os
+
+import numpy as np
+
+from forgot_again.file import load_ast_if_exists
+
+
+class AdjustmentTable:
+    # corrections from adjust.ini indexed by sweep coordinates instead of the point order,
+    # linear interpolation along u_control within a supply voltage and then between the two nearest supply voltages,
+    # clamped to the table edges outside of it
+    columns = ('f_tune', 'p_out', 'i_src')
+
+    def __init__(self, points):
+        # points -- list of {'u_src', 'u_control', 'f_tune', 'p_out', 'i_src'}, the adjust.ini format
+        by_supply = dict()
+        for point in points:
+            by_supply.setdefault(float(point['u_src']), list()).append(point)
+
+        self.supplies = np.array(sorted(by_supply))
+        self._grids = list()
+        for u_src in self.supplies:
+            rows = sorted(by_supply[u_src], key=lambda p: p['u_control'])
+            self._grids.append((
+                np.array([p['u_control'] for p in rows], dtype=float),
+                np.array([[p[name] for p in rows] for name in self.columns], dtype=float),
+            ))
+
+    def __len__(self):
+        return sum(len(u) for u, _ in self._grids)
+
+    def correction(self, u_src, u_control):
+        # corrections at the given coordinates, scalars or arrays, as a (columns, points) array
+        u_src, u_control = np.broadcast_arrays(np.atleast_1d(np.asarray(u_src, dtype=float)), np.atleast_1d(np.asarray(u_control, dtype=float)))
+
+        # every supply voltage's corrections at the requested control voltages, (supplies, columns, points)
+        along = np.array([[np.interp(u_control, u, values) for values in table] for u, table in self._grids])
+        if len(self.supplies) == 1:
+            return along[0]
+
+        hi = np.clip(np.searchsorted(self.supplies, u_src), 1, len(self.supplies) - 1)
+        lo = hi - 1
+        w = np.clip((u_src - self.supplies[lo]) / (self.supplies[hi] - self.supplies[lo]), 0, 1)
+        points = np.arange(len(u_src))
+        return (1 - w) * along[lo, :, points].T + w * along[hi, :, points].T
+
+    def apply(self, u_src, u_control, f_tune, p_out, i_src):
+        # corrected f_tune, p_out, i_src, whole sweeps at once
+        df, dp, di = self.correction(u_src, u_control)
+        return f_tune + df, p_out + dp, i_src + di
+
+
+# path -> (mtime, table), the file is parsed again only when it changes
+_cache = dict()
+
+
+def load_adjustment(file='adjust.ini'):
+    try:
+        mtime = os.stat(file).st_mtime_ns
+    except OSError:
+        _cache.pop(file, None)
+        return None
+
+    cached = _cache.get(file)
+    if cached is not None and cached[0] == mtime:
+        return cached[1]
+
+    points = load_ast_if_exists(file, default=None)
+    table = AdjustmentTable(points) if points else None
+    _cache[file] = (mtime, table)
+    return table
@@ -0,0 +1,204 @@
+import argparse
+import contextlib
+import io
+import itertools
+import json
+import os
+import sys
+import tempfile
+import time
+
+from forgot_again.file import load_ast_if_exists
+
+import simulator
+
+from timing import account, trace
+
+# headless end-to-end sweeps against the simulated bench:
+#   python benchmark.py                         -- run all cases, compare with benchmark.json if present
+#   python benchmark.py --save                  -- store the results as the new baseline
+#   python benchmark.py --acquisition fast.ini  -- try other acquisition settings against the same baseline
+#   python benchmark.py --trace traces          -- also write a Chrome trace / Perfetto timeline per case
+
+addrs = {
+    'Анализатор': 'SIM::bench::ANALYZER',
+    'Источник': 'SIM::bench::SOURCE',
+}
+
+grid_steps = {11: 1.0, 21: 0.5, 41: 0.25}
+# supply voltage axes as (min, max, step), the dense one is a pushing sweep
+supply_axes = {1: (5.0, 5.0, 0.0), 2: (4.75, 5.25, 0.5), 3: (4.75, 5.25, 0.25), 21: (4.5, 5.5, 0.05)}
+categories = ['sleep', 'io', 'storage', 'processing', 'export', 'plot']
+
+
+def make_cases():
+    return [
+        {
+            'name': f'u{points}-src{n_src}-{"harm" if harm else "main"}',
+            'u_vco_delta': grid_steps[points],
+            'supplies': supply_axes[n_src],
+            'is_harm': harm,
+        }
+        for points, n_src, harm in itertools.product(grid_steps, supply_axes, (False, True))
+    ]
+
+
+def run_case(case, args, acquisition, plot_widget_cls=None):
+    from instrumentcontroller import InstrumentController
+    from mytools.measurewidget import CancelToken
+    from measureresult import MeasureResult
+
+    simulator.bench_for(addrs['Анализатор'], params={'time_scale': args.time_scale, 'seed': args.seed})
+
+    controller = InstrumentController(addrs=addrs, name='bench')
+    controller.acquisitionParams = acquisition
+    controller.deviceParams = {'ГУН': {'file': 'input.xlsx'}}
+
+    controller.secondaryParams.params = {
+        **controller.secondaryParams.params,
+        'u_src_min': case['supplies'][0],
+        'u_src_max': case['supplies'][1],
+        'u_src_delta': case['supplies'][2],
+        'u_vco_min': 0.0,
+        'u_vco_max': 10.0,
+        'u_vco_delta': case['u_vco_delta'],
+        'sa_min': 2.0,
+        'sa_max': 4.5,
+        'is_harm': case['is_harm'],
+        'file_name': case['name'],
+    }
+
+    plot_widget = None
+    if plot_widget_cls is not None:
+        plot_widget = plot_widget_cls(controller=controller)
+
+        # the same path as the main window: payloads into a separate result, changed curves redrawn from it
+        live = MeasureResult(track_changes=True)
+
+        def on_points_ready(batch):
+            with account.measure('plot'):
+                for payload in batch:
+                    live.add_payload(payload)
+                plot_widget.plot_changed(live)
+        # the sweep runs on this thread, so the feed hands out a frame's batch from push() instead of a timer
+        controller.feed.synchronous = True
+        controller.feed.pointsReady.connect(on_points_ready)
+
+    controller.connect(addrs)
+    token = CancelToken()
+    controller.check(token, ['ГУН', None])
+
+    account.reset()
+    trace.clear()
+    start = time.perf_counter()
+
+    controller.measure(token, ['ГУН', None])
+    with account.measure('processing'):
+        controller.result._process()
+    if plot_widget is not None:
+        with account.measure('plot'):
+            plot_widget.plot()
+    with account.measure('export'):
+        controller.result.export_excel(open_explorer=False)
+
+    wall = time.perf_counter() - start
+    totals = account.totals()
+    # every reading taken, fundamentals and harmonics alike, so -main and -harm cases compare per reading
+    points = controller.points_done
+    return {
+        'points': points,
+        'fundamentals': controller.result.points,
+        'wall': wall,
+        'points_per_s': points / wall if wall else 0.0,
+        **{k: totals.get(k, 0.0) for k in categories},
+        'other': wall - sum(totals.get(k, 0.0) for k in categories),
+    }
+
+
+def report(results, baseline):
+    header = f'{"case":<18}{"pts":>5}{"fund":>5}{"wall,s":>9}{"pts/s":>8}' + ''.join(f'{c:>11}' for c in categories + ['other'])
+    if baseline:
+        header += f'{"vs base":>9}'
+    print(header)
+
+    for name, r in results.items():
+        line = f'{name:<18}{r["points"]:>5}{r["fundamentals"]:>5}{r["wall"]:>9.2f}{r["points_per_s"]:>8.2f}' + \
+            ''.join(f'{r[c]:>11.2f}' for c in categories + ['other'])
+        base = baseline.get('results', {}).get(name)
+        if base and base['wall']:
+            # >1 means faster than the baseline
+            line += f'{base["wall"] / r["wall"]:>8.2f}x'
+        print(line)
+
+    total = sum(r['wall'] for r in results.values())
+    print(f'total wall time {total:.2f} s')
+    base_total = sum(baseline.get('results', {}).get(name, {}).get('wall', 0.0) for name in results)
+    if baseline and base_total:
+        print(f'baseline {base_total:.2f} s, speedup {base_total / total:.2f}x')
+
+
+def main(argv):
+    parser = argparse.ArgumentParser(description='VCO sweep throughput benchmark on the simulated bench')
+    parser.add_argument('--cases', default='', help='run only cases containing this substring')
+    parser.add_argument('--time-scale', type=float, default=0.1, help='simulated bench time scale')
+    parser.add_argument('--seed', type=int, default=1)
+    parser.add_argument('--acquisition', default='acquisition.ini', help='acquisition settings to benchmark')
+    parser.add_argument('--baseline', default='benchmark.json')
+    parser.add_argument('--save', action='store_true', help='store the results as the new baseline')
+    parser.add_argument('--trace', default='', help='folder for per-case Chrome trace timelines')
+    parser.add_argument('--verbose', action='store_true', help='keep the measurement log')
+    parser.add_argument('--plot', action='store_true', help='include plot updates, needs a Qt platform (offscreen is fine)')
+    args = parser.parse_args(argv)
+
+    acquisition = load_ast_if_exists(args.acquisition, default={})
+    baseline_path = os.path.abspath(args.baseline)
+    trace_path = os.path.abspath(args.trace) if args.trace else ''
+    if trace_path:
+        os.makedirs(trace_path, exist_ok=True)
+    baseline = dict()
+    if os.path.isfile(baseline_path):
+        with open(baseline_path, mode='rt', encoding='utf-8') as f:
+            baseline = json.load(f)
+        if baseline.get('time_scale') != args.time_scale:
+            print(f'baseline was taken at time scale {baseline.get("time_scale")}, not comparable')
+            baseline = dict()
+
+    plot_widget_cls = None
+    if args.plot:
+        from PyQt5.QtWidgets import QApplication
+        from primaryplotwidget import PrimaryPlotWidget
+        app = QApplication.instance() or QApplication(sys.argv)
+        plot_widget_cls = PrimaryPlotWidget
+
+    cases = [c for c in make_cases() if args.cases in c['name']]
+
+    # runs, journals and exports go to a scratch folder, settings are read from the current one above
+    results = dict()
+    cwd = os.getcwd()
+    with tempfile.TemporaryDirectory(prefix='vco-bench-') as work_dir:
+        os.chdir(work_dir)
+        try:
+            for case in cases:
+                print(f'running {case["name"]}')
+                with contextlib.redirect_stdout(sys.stdout if args.verbose else io.StringIO()):
+                    results[case['name']] = run_case(case, args, acquisition, plot_widget_cls)
+                if trace_path:
+                    trace.export_chrome(os.path.join(trace_path, f'{case["name"]}.json'))
+        finally:
+            os.chdir(cwd)
+
+    report(results, baseline)
+
+    if args.save:
+        with open(baseline_path, mode='wt', encoding='utf-8') as f:
+            json.dump({
+                'time_scale': args.time_scale,
+                'seed': args.seed,
+                'acquisition': acquisition,
+                'results': results,
+            }, f, ensure_ascii=False, indent=1)
+        print(f'baseline saved to {baseline_path}')
+
+
+if __name__ == '__main__':
+    main(sys.argv[1:])
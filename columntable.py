@@ -0,0 +1,57 @@
+import numpy as np
+import pandas as pd
+
+
+class ColumnTable:
+    # float64 columns in preallocated arrays, the capacity doubles when full,
+    # rows are kept sorted by the key column, so in-order appends are O(1) amortised
+    # and an out-of-order row (adaptive grid refinement) shifts the tail once
+
+    def __init__(self, columns, key=None, capacity=64):
+        self._columns = list(columns)
+        self._key = key
+        self._size = 0
+        self._data = np.empty((len(self._columns), capacity), dtype=np.float64)
+        self._index = {name: i for i, name in enumerate(self._columns)}
+
+    def __len__(self):
+        return self._size
+
+    @property
+    def columns(self):
+        return list(self._columns)
+
+    @property
+    def nbytes(self):
+        return self._data[:, :self._size].nbytes
+
+    def append(self, row):
+        if self._size == self._data.shape[1]:
+            grown = np.empty((self._data.shape[0], 2 * self._data.shape[1]), dtype=np.float64)
+            grown[:, :self._size] = self._data[:, :self._size]
+            self._data = grown
+
+        values = [row[name] for name in self._columns]
+        pos = self._size
+        if self._key is not None and self._size:
+            key = self._data[self._index[self._key], :self._size]
+            value = row[self._key]
+            if value < key[-1]:
+                pos = int(np.searchsorted(key, value, side='right'))
+                self._data[:, pos + 1:self._size + 1] = self._data[:, pos:self._size]
+        self._data[:, pos] = values
+        self._size += 1
+        return pos
+
+    def column(self, name):
+        # read-only view, valid until the next append
+        view = self._data[self._index[name], :self._size]
+        view.flags.writeable = False
+        return view
+
+    def clear(self):
+        self._size = 0
+
+    def to_frame(self, columns=None):
+        columns = columns or self._columns
+        return pd.DataFrame({name: self._data[self._index[name], :self._size].copy() for name in columns})
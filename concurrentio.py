@@ -0,0 +1,37 @@
+from concurrent.futures import ThreadPoolExecutor, wait
+
+
+class ConcurrentIO:
+    # one worker thread per instrument: commands to the same instrument stay
+    # in order, commands to different instruments overlap
+
+    def __init__(self, names, enabled=True):
+        self._executors = {
+            name: ThreadPoolExecutor(max_workers=1, thread_name_prefix=f'io-{name}')
+            for name in names
+        } if enabled else dict()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.shutdown()
+
+    @property
+    def enabled(self):
+        return bool(self._executors)
+
+    def run(self, *jobs):
+        # jobs are (instrument name, callable) pairs, results are returned in the same order
+        if not self.enabled:
+            return [fn() for _, fn in jobs]
+
+        futures = [self._executors[name].submit(fn) for name, fn in jobs]
+        # let every instrument finish before re-raising, so no command is left in flight
+        wait(futures)
+        return [f.result() for f in futures]
+
+    def shutdown(self):
+        for executor in self._executors.values():
+            executor.shutdown(wait=True)
+        self._executors.clear()
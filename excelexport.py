@@ -0,0 +1,55 @@
+from concurrent.futures import ThreadPoolExecutor
+
+from PyQt5.QtCore import QObject, pyqtSignal
+from mytools.measurewidget import CancelToken
+
+from measureresult import write_excel
+
+
+class ExcelExporter(QObject):
+    # writes reports off the GUI thread, one at a time, in the order they were requested,
+    # the result is snapshotted on request, on the caller's thread, so export() must not be called while
+    # another thread is writing the result, the snapshot then no longer depends on it and exports can be queued
+    exportProgress = pyqtSignal(str, int, int)
+    exportFinished = pyqtSignal(str, bool)
+
+    def __init__(self, parent=None):
+        super().__init__(parent=parent)
+
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='export')
+        self._tokens = set()
+
+    @property
+    def busy(self):
+        return bool(self._tokens)
+
+    def export(self, result, open_explorer=True):
+        snapshot = result.export_snapshot()
+        file_name = snapshot['file_name']
+        token = CancelToken()
+        self._tokens.add(token)
+        self._executor.submit(self._export, snapshot, token, open_explorer)
+        return file_name
+
+    def cancel_all(self):
+        for token in list(self._tokens):
+            token.cancelled = True
+
+    def shutdown(self):
+        self.cancel_all()
+        self._executor.shutdown(wait=True)
+
+    def _export(self, snapshot, token, open_explorer):
+        file_name = snapshot['file_name']
+        ok = False
+        try:
+            ok = write_excel(
+                snapshot,
+                open_explorer=open_explorer,
+                progress=lambda done, total: self.exportProgress.emit(file_name, done, total),
+                token=token,
+            ) is not None
+        except Exception as ex:
+            print(f'{file_name}: export error:', ex)
+        self._tokens.discard(token)
+        self.exportFinished.emit(file_name, ok)
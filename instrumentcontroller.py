@@ -1,18 +1,29 @@
 import ast
-import time
 
-from collections import defaultdict
-from os.path import isfile
+from os.path import join
 
 import numpy as np
 import pandas as pd
 
-from PyQt5.QtCore import QObject, pyqtSlot, pyqtSignal
-from forgot_again.file import load_ast_if_exists, pprint_to_file
+from PyQt5.QtCore import QObject, pyqtSlot
+from forgot_again.file import load_ast_if_exists, pprint_to_file, make_dirs
+from forgot_again.string import now_timestamp
 
 from instr.instrumentfactory import mock_enabled, SourceFactory, AnalyzerFactory
+from adaptivegrid import AdaptiveGrid
+from concurrentio import ConcurrentIO
+from journal import PointJournal
 from measureresult import MeasureResult
+from offsets import load_offsets
+from pointfeed import PointFeed, TraceFeed, make_payload
+from runstorage import RunWriter
+from scpicache import CachedInstrument
 from secondaryparams import SecondaryParams
+from settle import SettleEngine
+from timing import account, SweepPhase, TimedInstrument
+from simulator import is_simulated, SimulatedAnalyzerFactory, SimulatedSourceFactory
+from tracepeak import TracePeakReader
+from tracking import FrequencyTracker
 
 GIGA = 1_000_000_000
 MEGA = 1_000_000
@@ -24,19 +35,26 @@ MILLI = 1 / 1_000
 
 
 class InstrumentController(QObject):
-    pointReady = pyqtSignal()
 
-    def __init__(self, parent=None):
+    def __init__(self, parent=None, addrs=None, name=''):
         super().__init__(parent=parent)
 
-        addrs = load_ast_if_exists('instr.ini', default={
+        # measured points for the GUI, see pointfeed.py
+        self.feed = PointFeed(parent=self)
+        # analyzer traces for the waterfall, only read when peaks are found from the trace
+        self.traces = TraceFeed()
+
+        # named controllers belong to a station in a multi-station setup and keep their files apart
+        self.name = name
+        self.out_path = join('stations', name) if name else '.'
+
+        addrs = addrs or load_ast_if_exists('instr.ini', default={
             'Анализатор': 'GPIB1::18::INSTR',
             'Источник': 'GPIB1::3::INSTR',
         })
 
         self.requiredInstruments = {
-            'Анализатор': AnalyzerFactory(addrs['Анализатор']),
-            'Источник': SourceFactory(addrs['Источник']),
+            k: _make_factory(k, v) for k, v in addrs.items()
         }
 
         self.deviceParams = load_ast_if_exists('devices.ini', default={
@@ -47,17 +65,17 @@ class InstrumentController(QObject):
 
         self.secondaryParams = SecondaryParams(required={
             'sep_4': ['', {'value': None}],
-            'u_src_drift_1': [
-                'Uп1=',
-                {'start': 0.0, 'end': 10.0, 'step': 0.5, 'value': 4.7, 'suffix': ' В'}
+            'u_src_min': [
+                'Uп.мин.=',
+                {'start': 0.0, 'end': 10.0, 'step': 0.05, 'decimals': 2, 'value': 4.75, 'suffix': ' В'}
             ],
-            'u_src_drift_2': [
-                'Uп2=',
-                {'start': 0.0, 'end': 10.0, 'step': 0.5, 'value': 5.0, 'suffix': ' В'}
+            'u_src_max': [
+                'Uп.макс.=',
+                {'start': 0.0, 'end': 10.0, 'step': 0.05, 'decimals': 2, 'value': 5.25, 'suffix': ' В'}
             ],
-            'u_src_drift_3': [
-                'Uп3=',
-                {'start': 0.0, 'end': 10.0, 'step': 0.5, 'value': 5.3, 'suffix': ' В'}
+            'u_src_delta': [
+                'ΔUп=',
+                {'start': 0.0, 'end': 10.0, 'step': 0.05, 'decimals': 2, 'value': 0.25, 'suffix': ' В'}
             ],
             'i_src_max': [
                 'Iп.макс=',
@@ -93,6 +111,14 @@ class InstrumentController(QObject):
                 'Span=',
                 {'start': 0.0, 'end': 30000.0, 'step': 1.0, 'value': 50.0, 'suffix': ' МГц'}
             ],
+            'is_harm': [
+                'Гармоники',
+                {'value': True}
+            ],
+            'is_harm_fused': [
+                'Гарм. за один проход',
+                {'value': False}
+            ],
             'sep_3': ['', {'value': None}],
             'file_name': [
                 'Имя файла=',
@@ -109,6 +135,8 @@ class InstrumentController(QObject):
         })
         self.secondaryParams.load_from_config('params.ini')
 
+        self.acquisitionParams = load_ast_if_exists('acquisition.ini', default={})
+
         self._calibrated_pows_lo = load_ast_if_exists('cal_lo.ini', default={})
         self._calibrated_pows_mod = load_ast_if_exists('cal_mod.ini', default={})
         self._calibrated_pows_rf = load_ast_if_exists('cal_rf.ini', default={})
@@ -119,6 +147,11 @@ class InstrumentController(QObject):
         self.hasResult = False
 
         self.result = MeasureResult()
+        if name:
+            self.result.path = join(MeasureResult.path, name)
+
+        self.points_done = 0
+        self.points_total = 0
 
     def __str__(self):
         return f'{self._instruments}'
@@ -127,6 +160,9 @@ class InstrumentController(QObject):
     def connect(self, addrs):
         print(f'searching for {addrs}')
         for k, v in addrs.items():
+            # SIM... addresses switch the instrument to the simulated bench and back
+            if is_simulated(v) != is_simulated(self.requiredInstruments[k].addr):
+                self.requiredInstruments[k] = _make_factory(k, v)
             self.requiredInstruments[k].addr = v
         self.found = self._find()
 
@@ -175,6 +211,8 @@ class InstrumentController(QObject):
     # region initialization
     def _clear(self):
         self.result.clear()
+        self.feed.clear()
+        self.traces.clear()
 
     def _init(self):
         self._instruments['Источник'].send('*RST')
@@ -185,6 +223,8 @@ class InstrumentController(QObject):
     def measure(self, token, params):
         print(f'call measure with {token} {params}')
         device, _ = params
+        # a failed or cancelled run must not leave the previous run's result flag behind
+        self.hasResult = False
         try:
             self.result.set_secondary_params(self.secondaryParams)
             self._measure(token, device)
@@ -192,90 +232,255 @@ class InstrumentController(QObject):
             self.hasResult = True  # TODO HACK
         except RuntimeError as ex:
             print('runtime error:', ex)
+        return self.hasResult
+
+    def resume(self, token, params):
+        print(f'call resume with {token} {params}')
+        self.hasResult = False
+        if not self.found:
+            print('resume error: instruments not found')
+            return False
+        try:
+            self._measure(token, None, resume=True)
+            self.hasResult = True
+        except RuntimeError as ex:
+            print('runtime error:', ex)
+        return self.hasResult
+
+    def _measure(self, token, device, resume=False):
+        make_dirs(self.out_path)
+        journal = PointJournal(join(self.out_path, 'journal.jsonl'))
+
+        done = dict()
+        if resume:
+            # continue the journalled run with its own device and params
+            meta, done = journal.load()
+            if not meta:
+                raise RuntimeError(f'no run to resume in {journal.path}')
+            device = meta['device']
+            self.secondaryParams.params = {**self.secondaryParams.params, **meta['secondary']}
+            journal.reopen()
+        else:
+            journal.start({'device': device, 'secondary': self.secondaryParams.params})
 
-    def _measure(self, token, device):
         param = self.deviceParams[device]
         secondary = self.secondaryParams.params
         print(f'launch measure with {token} {param} {secondary}')
 
+        storage = RunWriter(join(self.out_path, 'runs', f'{secondary["file_name"]}-{now_timestamp()}'), meta={
+            'device': device,
+            'station': self.name,
+            'instruments': self._idns(),
+            'secondary': secondary,
+        })
+
         self._clear()
-        _, x2, x3 = self._measure_tune(token, param, secondary)
-        self.result.add_harmonics_measurement(x2, x3)
+        finished = False
+        try:
+            with ConcurrentIO(['Источник', 'Анализатор'], enabled=self.acquisitionParams.get('concurrent_io', True)) as io:
+                _, x2, x3 = self._measure_tune(token, param, secondary, io, journal, done, storage)
+            journal.finish()
+            finished = True
+        finally:
+            journal.close()
+            storage.close(finished=finished)
+            print(f'run saved to {storage.path}')
+        if mock_enabled:
+            # harmonics were added live as they were measured, mock mode swaps them for canned ones
+            self.result.add_harmonics_measurement(x2, x3)
         self.result.set_secondary_params(self.secondaryParams)
         return True
 
-    def _measure_tune(self, token, param, secondary):
-
-        def find_peak_read_marker(first=False):
-            sa.send('CALC:MARK1:MAX')
-
-            if not mock_enabled:
-                if first:
-                    time.sleep(2)
-                time.sleep(0.4)
-
-            if first:
-                sa.send('CALC:MARK1:MAX')
-                if not mock_enabled:
-                    time.sleep(1)
+    def _measure_tune(self, token, param, secondary, io, journal, done, storage):
+
+        def check_cancelled():
+            if token.cancelled:
+                if trace_reader is not None:
+                    trace_reader.restore()
+                src.send('OUTP OFF')
+                sa.send(':CAL:AUTO ON')
+                flush()
+                raise RuntimeError('measurement cancelled')
+
+        def flush():
+            for inst in (src, sa):
+                if isinstance(inst, CachedInstrument):
+                    inst.flush()
+                    print(f'{inst}: {inst.sent} messages sent, {inst.dropped} redundant writes dropped')
+
+        def find_peak_read_marker(span, first=False, reject=None):
+            step = 'marker_first' if first else 'marker'
+            if trace_reader is None:
+                return settle.read_peak(sa, step, reject=reject)
+            return settle.read_peak(sa, step, fetch=lambda: trace_reader.read(*span), reject=reject)
+
+        def set_source(u_drift, u_control, step):
+            src.send(f'APPLY p6v,{u_drift}V,{i_src_max}A')
+            src.send(f'APPLY p25v,{u_control}V,{i_tune_max}A')
+
+            settle.dwell(step, src)
+
+        def get_offset(u_drift, u_control):
+            # (MHz, dB), interpolated between the nodes of the device's offset table
+            return (0, 0) if offset is None else offset(u_drift, u_control)
+
+        def freq_offset(u_drift, u_control):
+            return get_offset(u_drift, u_control)[0] * MEGA
+
+        def tune_fundamental(u_drift, u_control, narrow=None):
+            # narrow -- (center, span) predicted by the tracker, full band if not given
+            # sa.send(f'DISP:WIND:TRAC:X:OFFS {0}Hz')
+            # sa.send(f'DISP:WIND:TRAC:Y:RLEV:OFFS {0}db')
+            x_off, y_off = get_offset(u_drift, u_control)
+            x_off = x_off * MEGA
+            sa.send(f'DISP:WIND:TRAC:X:OFFS {x_off}Hz')
+            sa.send(f'DISP:WIND:TRAC:Y:RLEV:OFFS {y_off}db')
+
+            if narrow is None:
+                sa.send(f':SENS:FREQ:STAR {sa_f_start}Hz')
+                sa.send(f':SENS:FREQ:STOP {sa_f_stop}Hz')
 
-            freq = float(sa.query(':CALC:MARK1:X?'))
-            pow_ = float(sa.query(':CALC:MARK1:Y?'))
-            return freq, pow_
+                settle.dwell('span', sa)
+                return sa_f_start + x_off, sa_f_stop + x_off
+
+            f_center, f_span = narrow
+            sa.send(f':SENS:FREQ:CENT {f_center}Hz')
+            sa.send(f':SENS:FREQ:SPAN {f_span}Hz')
+
+            settle.dwell('span', sa)
+            return f_center + x_off - f_span / 2, f_center + x_off + f_span / 2
+
+        def read_fundamental(u_drift, u_control, span, first, narrow):
+            if not narrow:
+                return find_peak_read_marker(span, first)
+
+            # the first reading in the narrow span decides, noise off a lost track would never settle
+            lost = list()
+
+            def reject(reading):
+                if not tracker.found(u_control, *reading, span):
+                    lost.append(reading)
+                return bool(lost)
+
+            reading = find_peak_read_marker(span, first, reject)
+            if lost:
+                print(f'lost track at {u_control} V, back to full span')
+                span = tune_fundamental(u_drift, u_control)
+                reading = find_peak_read_marker(span, first)
+            return reading
+
+        def read_current():
+            return float(src.query('MEAS:CURR? p6v'))
+
+        def measure_fundamental(u_drift, u_control, first):
+            # analyzer retunes while the source settles, supply current is read during the marker search
+            # narrow span around the extrapolated frequency when tracking
+            narrow = tracker.predict(u_control, sa_f_start, sa_f_stop)
+            _, span = io.run(
+                ('Источник', lambda: set_source(u_drift, u_control, 'source')),
+                ('Анализатор', lambda: tune_fundamental(u_drift, u_control, narrow)),
+            )
+            (read_f, read_p), read_i = io.run(
+                ('Анализатор', lambda: read_fundamental(u_drift, u_control, span, first, narrow is not None)),
+                ('Источник', read_current),
+            )
+            tracker.add(u_control, read_f - freq_offset(u_drift, u_control), read_p)
+
+            return {
+                'u_src': u_drift,
+                'u_control': u_control,
+                'read_f': read_f,
+                'read_p': read_p,
+                'read_i': read_i,
+            }
+
+        def tune_harmonic(multiplier, uc, f, u_drift):
+            sa.send(f'DISP:WIND:TRAC:X:OFFS {0}Hz')
+            sa.send(f'DISP:WIND:TRAC:Y:RLEV:OFFS {0}db')
+
+            x_off, y_off = get_offset(u_drift, uc)
+            x_off *= MEGA
+            f -= x_off
+            f_xmul = f * multiplier
+
+            sa.send(f':SENS:FREQ:CENT {f_xmul}Hz')
+            sa.send(f':SENS:FREQ:SPAN {sa_span}HZ')
 
-        def measure_harmonics(multiplier, pairs, offset, u_drift):
+            sa.send(f'DISP:WIND:TRAC:X:OFFS {x_off * multiplier}Hz')
+            # sa.send(f'DISP:WIND:TRAC:Y:RLEV:OFFS {y_off}db')
+
+            settle.dwell('span_harmonic', sa)
+            f_disp = f_xmul + x_off * multiplier
+            return f_disp - sa_span / 2, f_disp + sa_span / 2
+
+        def read_harmonic(uc, span):
+            if trace_reader is None:
+                _, read_p = settle.read_peak(sa, 'marker_harmonic')
+            else:
+                _, read_p = settle.read_peak(sa, 'marker_harmonic', fetch=lambda: trace_reader.read(*span))
+            # x1 = 1.747 G -> x1 + 1 G = 2.747
+            # x2 = 3.497 G -> x2 + 1 G = 4.497
+
+            return {
+                'u_control': uc,
+                'read_p': read_p,
+            }
+
+        def journalled_harmonic(multiplier, u_drift, uc, measure):
+            kind = f'x{multiplier}'
+            point = done.get(kind, {}).get((u_drift, uc))
+            if point is None:
+                with phase(kind):
+                    point = measure()
+                journal.append(kind, {'u_src': u_drift, **point})
+            storage.append(kind, {'u_src': u_drift, **point})
+            self._add_harmonic_point(multiplier, u_drift, uc, point['read_p'])
+            return {'u_control': uc, 'read_p': point['read_p']}
+
+        def measure_harmonic(multiplier, uc, f, u_drift):
+            check_cancelled()
+            _, span = io.run(
+                ('Источник', lambda: set_source(u_drift, uc, 'source_harmonic')),
+                ('Анализатор', lambda: tune_harmonic(multiplier, uc, f, u_drift)),
+            )
+            return read_harmonic(uc, span)
+
+        def measure_harmonics(multiplier, pairs, u_drift):
             print('measure harmonics:', multiplier)
+            phase.name = f'x{multiplier}'
             sa.send(f':SENS:FREQ:SPAN {sa_span}HZ')
-            r = []
-            for uc, f in pairs:
-
-                if token.cancelled:
-                    src.send('OUTP OFF')
-                    sa.send(':CAL:AUTO ON')
-                    raise RuntimeError('measurement cancelled')
-
-                src.send(f'APPLY p6v,{u_src_drift_1}V,{i_src_max}A')
-                src.send(f'APPLY p25v,{uc}V,{i_tune_max}A')
-
-                if not mock_enabled:
-                    time.sleep(1.5)
-
-                sa.send(f'DISP:WIND:TRAC:X:OFFS {0}Hz')
-                sa.send(f'DISP:WIND:TRAC:Y:RLEV:OFFS {0}db')
-
-                x_off, y_off = offset.get(u_drift, {}).get(uc, (0, 0))
-                x_off *= MEGA
-                f -= x_off
-                f_xmul = f * multiplier
-
-                sa.send(f':SENS:FREQ:CENT {f_xmul}Hz')
-                sa.send(f':SENS:FREQ:SPAN {sa_span}HZ')
-
-                sa.send(f'DISP:WIND:TRAC:X:OFFS {x_off * multiplier}Hz')
-                # sa.send(f'DISP:WIND:TRAC:Y:RLEV:OFFS {y_off}db')
-
-                if not mock_enabled:
-                    time.sleep(0.3)
-
-                sa.send('CALC:MARK1:MAX')
-
-                if not mock_enabled:
-                    time.sleep(0.3)
-
-                read_p = float(sa.query(f'CALC:MARK1:Y?'))
-                # x1 = 1.747 G -> x1 + 1 G = 2.747
-                # x2 = 3.497 G -> x2 + 1 G = 4.497
-
-                point = {
-                    'u_control': uc,
-                    'read_p': read_p,
-                }
-                r.append(point)
-
-            return r
-
-        src = self._instruments['Источник']
-        sa = self._instruments['Анализатор']
+            return [
+                journalled_harmonic(multiplier, u_drift, uc, lambda: measure_harmonic(multiplier, uc, f, u_drift))
+                for uc, f in pairs
+            ]
+
+        # trace tracks are named per station when several benches run in one process
+        prefix = f'{self.name}: ' if self.name else ''
+        phase = SweepPhase('main')
+        src = TimedInstrument(self._instruments['Источник'], name=f'{prefix}Источник', phase=phase)
+        sa = TimedInstrument(self._instruments['Анализатор'], name=f'{prefix}Анализатор', phase=phase)
+        if self.acquisitionParams.get('coalesce', True):
+            src = CachedInstrument(src, channel_headers=['APPLY'])
+            sa = CachedInstrument(sa)
+
+        # a simulated bench runs its clock faster, settle waits are scaled to match
+        settle = SettleEngine({
+            **self.acquisitionParams.get('settle', dict()),
+            'time_scale': getattr(self._instruments['Анализатор'], 'time_scale', 1.0),
+        }, name=f'{prefix}ожидание', phase=phase)
+
+        tracker = FrequencyTracker(self.acquisitionParams.get('tracking'))
+
+        grid = AdaptiveGrid(
+            self.acquisitionParams.get('grid'),
+            secondary['u_vco_min'],
+            secondary['u_vco_max'],
+            secondary['u_vco_delta']
+        )
+
+        trace_reader = None
+        if self.acquisitionParams.get('peak_mode', 'marker') == 'trace':
+            trace_reader = TracePeakReader(sa, binary=self.acquisitionParams.get('trace_binary', True), sink=self.traces.push)
 
         i_src_max = secondary['i_src_max'] * MILLI
 
@@ -289,18 +494,26 @@ class InstrumentController(QObject):
         sa_rlev = secondary['sa_rlev']
         sa_span = secondary['sa_span'] * MEGA
 
-        u_src_drift_1 = secondary['u_src_drift_1']
-        u_src_drift_2 = secondary['u_src_drift_2']
-        u_src_drift_3 = secondary['u_src_drift_3']
+        u_src_min = secondary['u_src_min']
+        u_src_max = secondary['u_src_max']
+        u_src_step = secondary['u_src_delta']
+
+        is_harm = secondary['is_harm']
+        is_harm_fused = is_harm and secondary['is_harm_fused']
 
         file_name = param['file']
 
-        u_control_values = [round(x, 2) for x in np.arange(start=u_tune_min, stop=u_tune_max + 0.002, step=u_tune_step)]
-        u_drift_values = [u for u in [u_src_drift_1, u_src_drift_2, u_src_drift_3] if u]
+        u_control_values = grid.initial() if grid.enabled else \
+            [round(x, 2) for x in np.arange(start=u_tune_min, stop=u_tune_max + 0.002, step=u_tune_step)]
+        u_drift_values = _axis(u_src_min, u_src_max, u_src_step)
+
+        # fundamental, x2 and x3 per point, adaptive grid refinements are not known in advance
+        self.points_done = 0
+        self.points_total = (3 if is_harm else 1) * len(u_control_values) * len(u_drift_values)
 
         # region main measure
         # TODO set source according to the source model
-        src.send(f'APPLY p6v,{u_src_drift_1}V,{i_src_max}A')
+        src.send(f'APPLY p6v,{u_drift_values[0]}V,{i_src_max}A')
         src.send(f'APPLY p25v,{u_control_values[0]}V,{i_tune_max}A')
 
         sa.send(f'DISP:WIND:TRAC:Y:RLEV {sa_rlev}')
@@ -318,142 +531,125 @@ class InstrumentController(QObject):
                 index = 0
                 mocked_raw_data = ast.literal_eval(''.join(f.readlines()))
 
-        offset = defaultdict(dict)
-        if isfile(file_name):
-            print(f'found {file_name}, load offsets')
-            tmp = pd.read_excel(file_name, engine='openpyxl').to_dict('records')
-            for row in tmp:
-                offset[row['Vcc']][row['Vctr']] = (row['Freq offs'], row['Pow offs'])
+        # parsed once per workbook change, see offsets.py
+        offset = load_offsets(file_name)
 
         result = []
+        harm_x2_totals = []
+        harm_x3_totals = []
         for u_drift in u_drift_values:
             first = True
-            for u_control in u_control_values:
-
-                if token.cancelled:
-                    src.send('OUTP OFF')
-                    sa.send(':CAL:AUTO ON')
-                    raise RuntimeError('measurement cancelled')
+            tracker.reset()
+            harm_x2 = []
+            harm_x3 = []
+            measured = []
+            u_control_queue = list(u_control_values)
+            while u_control_queue:
+                u_control = u_control_queue.pop(0)
 
-                src.send(f'APPLY p6v,{u_drift}V,{i_src_max}A')
-                src.send(f'APPLY p25v,{u_control}V,{i_tune_max}A')
+                raw_point = done.get('main', {}).get((u_drift, u_control))
+                if raw_point is None:
+                    check_cancelled()
 
-                if not mock_enabled:
-                    time.sleep(1)
+                    raw_point = measure_fundamental(u_drift, u_control, first)
+                    first = False
 
-                # sa.send(f'DISP:WIND:TRAC:X:OFFS {0}Hz')
-                # sa.send(f'DISP:WIND:TRAC:Y:RLEV:OFFS {0}db')
-                x_off, y_off = offset.get(u_drift, {}).get(u_control, (0, 0))
-                x_off = x_off * MEGA
-                sa.send(f'DISP:WIND:TRAC:X:OFFS {x_off}Hz')
-                sa.send(f'DISP:WIND:TRAC:Y:RLEV:OFFS {y_off}db')
-
-                sa.send(f':SENS:FREQ:STAR {sa_f_start}Hz')
-                sa.send(f':SENS:FREQ:STOP {sa_f_stop}Hz')
+                    print('measured point:', raw_point)
 
-                if not mock_enabled:
-                    time.sleep(0.4)
+                    if mock_enabled:
+                        raw_point = mocked_raw_data[index]
+                        index += 1
 
-                read_f, read_p = find_peak_read_marker(first)
-                first = False
-                read_i = float(src.query('MEAS:CURR? p6v'))
+                    journal.append('main', raw_point)
+                else:
+                    print('journalled point:', raw_point)
+                    tracker.add(u_control, raw_point['read_f'] - freq_offset(u_drift, u_control), raw_point['read_p'])
+                storage.append('main', raw_point)
 
-                raw_point = {
-                    'u_src': u_drift,
-                    'u_control': u_control,
-                    'read_f': read_f,
-                    'read_p': read_p,
-                    'read_i': read_i,
-                }
+                self._add_measure_point(raw_point)
 
-                print('measured point:', raw_point)
+                result.append(raw_point)
+                measured.append((raw_point['u_control'], raw_point['read_f'], raw_point['read_p']))
 
-                if mock_enabled:
-                    raw_point = mocked_raw_data[index]
-                    index += 1
+                # source is already settled at this point, retune analyzer only
+                if is_harm_fused:
+                    f = raw_point['read_f']
+                    harm_x2.append(journalled_harmonic(
+                        2, u_drift, u_control, lambda: read_harmonic(u_control, tune_harmonic(2, u_control, f, u_drift))
+                    ))
+                    harm_x3.append(journalled_harmonic(
+                        3, u_drift, u_control, lambda: read_harmonic(u_control, tune_harmonic(3, u_control, f, u_drift))
+                    ))
+                    print('measured harmonics:', harm_x2[-1], harm_x3[-1])
 
-                self._add_measure_point(raw_point)
+                if not u_control_queue:
+                    u_control_queue = grid.refine(measured)
+                    if u_control_queue:
+                        print(f'refining grid at {u_control_queue}')
 
-                result.append(raw_point)
+            if is_harm_fused:
+                harm_x2_totals.append(harm_x2)
+                harm_x3_totals.append(harm_x3)
 
-            if not mock_enabled:
-                time.sleep(5)
+            settle.dwell('supply')
 
-        with open('out.txt', mode='wt', encoding='utf-8') as out_file:
-            out_file.write(str(result))
+        if tracker.enabled:
+            print(f'tracking: {tracker.hits} narrow span hits, {tracker.misses} misses')
 
         offs_template = pd.DataFrame([{'Vcc': r['u_src'], 'Vctr': r['u_control'], 'Freq offs': 0, 'Pow offs': 0} for r in result])
-        offs_template.to_excel('template.xlsx', engine='openpyxl', index=False)
+        offs_template.to_excel(join(self.out_path, 'template.xlsx'), engine='openpyxl', index=False)
 
         # -- measure harmonics --
 
-        harm_x2_totals = []
-        harm_x3_totals = []
-
-        pairs = [[row['u_control'], row['read_f']] for row in result if row['u_src'] == u_src_drift_1]
-        result_harmonics_x2 = measure_harmonics(multiplier=2, pairs=pairs, offset=offset, u_drift=u_src_drift_1)
-        result_harmonics_x3 = measure_harmonics(multiplier=3, pairs=pairs, offset=offset, u_drift=u_src_drift_1)
+        if is_harm and not is_harm_fused:
+            for u_drift in u_drift_values:
+                pairs = [[row['u_control'], row['read_f']] for row in result if row['u_src'] == u_drift]
+                harm_x2_totals.append(measure_harmonics(multiplier=2, pairs=pairs, u_drift=u_drift))
+                harm_x3_totals.append(measure_harmonics(multiplier=3, pairs=pairs, u_drift=u_drift))
 
-        if mock_enabled:
-            with open('./mock_data/x2_1.txt', mode='rt', encoding='utf-8') as f:
-                result_harmonics_x2 = ast.literal_eval(''.join(f.readlines()))
-            with open('./mock_data/x3_2.txt', mode='rt', encoding='utf-8') as f:
-                result_harmonics_x3 = ast.literal_eval(''.join(f.readlines()))
-
-        harm_x2_totals.append(result_harmonics_x2)
-        harm_x3_totals.append(result_harmonics_x3)
-        with open('./x2_1.txt', mode='wt', encoding='utf-8') as f:
-            f.writelines(str(result_harmonics_x2))
-        with open('./x3_1.txt', mode='wt', encoding='utf-8') as f:
-            f.writelines(str(result_harmonics_x3))
-
-        if u_src_drift_2:
-            pairs = [[row['u_control'], row['read_f']] for row in result if row['u_src'] == u_src_drift_2]
-            result_harmonics_x2 = measure_harmonics(multiplier=2, pairs=pairs, offset=offset, u_drift=u_src_drift_2)
-            result_harmonics_x3 = measure_harmonics(multiplier=3, pairs=pairs, offset=offset, u_drift=u_src_drift_2)
-
-            if mock_enabled:
-                with open('./mock_data/x2_2.txt', mode='rt', encoding='utf-8') as f:
-                    result_harmonics_x2 = ast.literal_eval(''.join(f.readlines()))
-                with open('./mock_data/x3_2.txt', mode='rt', encoding='utf-8') as f:
-                    result_harmonics_x3 = ast.literal_eval(''.join(f.readlines()))
-
-            harm_x2_totals.append(result_harmonics_x2)
-            harm_x3_totals.append(result_harmonics_x3)
-            with open('./x2_2.txt', mode='wt', encoding='utf-8') as f:
-                f.writelines(str(result_harmonics_x2))
-            with open('./x3_2.txt', mode='wt', encoding='utf-8') as f:
-                f.writelines(str(result_harmonics_x3))
-
-        if u_src_drift_3:
-            pairs = [[row['u_control'], row['read_f']] for row in result if row['u_src'] == u_src_drift_3]
-            result_harmonics_x2 = measure_harmonics(multiplier=2, pairs=pairs, offset=offset, u_drift=u_src_drift_3)
-            result_harmonics_x3 = measure_harmonics(multiplier=3, pairs=pairs, offset=offset, u_drift=u_src_drift_3)
-
-            if mock_enabled:
-                with open('./mock_data/x2_3.txt', mode='rt', encoding='utf-8') as f:
-                    result_harmonics_x2 = ast.literal_eval(''.join(f.readlines()))
-                with open('./mock_data/x3_3.txt', mode='rt', encoding='utf-8') as f:
-                    result_harmonics_x3 = ast.literal_eval(''.join(f.readlines()))
-
-            harm_x2_totals.append(result_harmonics_x2)
-            harm_x3_totals.append(result_harmonics_x3)
-            with open('./x2_3.txt', mode='wt', encoding='utf-8') as f:
-                f.writelines(str(result_harmonics_x2))
-            with open('./x3_3.txt', mode='wt', encoding='utf-8') as f:
-                f.writelines(str(result_harmonics_x3))
+        if mock_enabled and is_harm:
+            # canned harmonics exist for the first three supply voltages only
+            for n, _ in enumerate(u_drift_values[:3], start=1):
+                with open(f'./mock_data/x2_{n}.txt', mode='rt', encoding='utf-8') as f:
+                    harm_x2_totals[n - 1] = ast.literal_eval(''.join(f.readlines()))
+                with open(f'./mock_data/x3_{n}.txt', mode='rt', encoding='utf-8') as f:
+                    harm_x3_totals[n - 1] = ast.literal_eval(''.join(f.readlines()))
 
         # endregion
 
+        if trace_reader is not None:
+            trace_reader.restore()
+
         src.send('OUTPut OFF')
         sa.send(':CAL:AUTO ON')
+        flush()
 
         return result, harm_x2_totals, harm_x3_totals
 
+    def _idns(self):
+        idns = dict()
+        for k, v in self._instruments.items():
+            try:
+                idns[k] = v.query('*IDN?').strip()
+            except Exception as ex:
+                print(f'{k}: *IDN? error:', ex)
+                idns[k] = str(v)
+        return idns
+
     def _add_measure_point(self, data):
         print('measured point:', data)
-        self.result.add_point(data)
-        self.pointReady.emit()
+        with account.measure('processing'):
+            point = self.result.add_point(data)
+        self.points_done += 1
+        self.points_total = max(self.points_total, self.points_done)
+        self.feed.push(make_payload('main', point['u_src'], point['u_control'], point, self.points_done, self.points_total))
+
+    def _add_harmonic_point(self, multiplier, u_src, u_control, read_p):
+        with account.measure('processing'):
+            self.result.add_harmonic_point(multiplier, u_src, u_control, read_p)
+        self.points_done += 1
+        self.points_total = max(self.points_total, self.points_done)
+        self.feed.push(make_payload(f'x{multiplier}', u_src, u_control, {'read_p': read_p}, self.points_done, self.points_total))
 
     def saveConfigs(self):
         pprint_to_file('params.ini', self.secondaryParams.params)
@@ -465,3 +661,19 @@ class InstrumentController(QObject):
     @property
     def status(self):
         return [i.status for i in self._instruments.values()]
+
+
+def _make_factory(label, addr):
+    factories = {
+        'Анализатор': (AnalyzerFactory, SimulatedAnalyzerFactory),
+        'Источник': (SourceFactory, SimulatedSourceFactory),
+    }
+    real, simulated = factories[label]
+    return simulated(addr) if is_simulated(addr) else real(addr)
+
+
+def _axis(start, stop, step):
+    # inclusive voltage axis, a zero step or an empty range gives the start value only
+    if step <= 0 or stop <= start:
+        return [round(start, 4)]
+    return [round(float(x), 4) for x in np.arange(start=start, stop=stop + step / 2, step=step)]
@@ -0,0 +1,73 @@
+import json
+import os
+
+from forgot_again.string import now_timestamp
+
+from timing import account
+
+
+class PointJournal:
+    # append-only log of acquired points, one JSON object per line,
+    # each line is flushed to disk before the sweep moves on
+
+    def __init__(self, path):
+        self._path = path
+        self._file = None
+
+    @property
+    def path(self):
+        return self._path
+
+    def exists(self):
+        return os.path.isfile(self._path)
+
+    def start(self, meta):
+        self.close()
+        self._file = open(self._path, mode='wt', encoding='utf-8')
+        self._write({'kind': 'run', 'started': now_timestamp(), **meta})
+
+    def reopen(self):
+        self.close()
+        self._file = open(self._path, mode='at', encoding='utf-8')
+        self._write({'kind': 'resume', 'started': now_timestamp()})
+
+    def append(self, kind, point):
+        self._write({'kind': kind, **point})
+
+    def finish(self):
+        self._write({'kind': 'done', 'finished': now_timestamp()})
+        self.close()
+
+    def close(self):
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+    def load(self):
+        # returns run metadata and {kind: {(u_src, u_control): point}} of the journalled points
+        meta = dict()
+        points = dict()
+        if not self.exists():
+            return meta, points
+
+        with open(self._path, mode='rt', encoding='utf-8') as f:
+            for line in f:
+                try:
+                    record = json.loads(line)
+                except json.JSONDecodeError:
+                    # last line may be cut short by a crash
+                    continue
+                kind = record.pop('kind')
+                if kind == 'run':
+                    meta = record
+                elif kind in ('resume', 'done'):
+                    continue
+                else:
+                    points.setdefault(kind, dict())[(record['u_src'], record['u_control'])] = record
+        return meta, points
+
+    def _write(self, record):
+        with account.measure('storage'):
+            self._file.write(json.dumps(record, ensure_ascii=False) + '\n')
+            self._file.flush()
+            os.fsync(self._file.fileno())
@@ -6,14 +6,20 @@ from subprocess import Popen
 
 from PyQt5 import uic
 from PyQt5.QtGui import QGuiApplication
-from PyQt5.QtWidgets import QMainWindow
+from PyQt5.QtWidgets import QMainWindow, QFileDialog
 from PyQt5.QtCore import Qt, pyqtSignal, pyqtSlot
 
 from formlayout.formlayout import fedit
 from instrumentcontroller import InstrumentController
+from excelexport import ExcelExporter
+from measureresult import MeasureResult
 from measurewidgetwithsecondaryparams import MeasureWidgetWithSecondaryParameters
 from mytools.connectionwidget import ConnectionWidget
 from primaryplotwidget import PrimaryPlotWidget
+from stationpool import StationPool
+from stationswidget import StationsWidget
+from timingwidget import TimingWidget
+from waterfallwidget import WaterfallWidget
 
 
 class MainWindow(QMainWindow):
@@ -32,6 +38,14 @@ class MainWindow(QMainWindow):
         self._connectionWidget = ConnectionWidget(parent=self, controller=self._instrumentController)
         self._measureWidget = MeasureWidgetWithSecondaryParameters(parent=self, controller=self._instrumentController)
         self._plotWidget = PrimaryPlotWidget(parent=self, controller=self._instrumentController)
+        self._timingWidget = TimingWidget(parent=self)
+        # GUI-side copy of the running sweep, built from the point payloads only,
+        # the controller's result belongs to the measurement thread until the task ends
+        self._liveResult = MeasureResult(track_changes=True)
+        self._waterfallWidget = WaterfallWidget(parent=self, feed=self._instrumentController.traces)
+
+        self._stationPool = StationPool(parent=self)
+        self._exporter = ExcelExporter(parent=self)
 
         # init UI
         self._ui = uic.loadUi('mainwindow.ui', self)
@@ -40,11 +54,19 @@ class MainWindow(QMainWindow):
         self._ui.layInstrs.insertWidget(0, self._connectionWidget)
         self._ui.layInstrs.insertWidget(1, self._measureWidget)
         self._ui.tabWidget.insertTab(0, self._plotWidget, 'Прогресс измерения')
+        self._ui.tabWidget.insertTab(1, self._waterfallWidget, 'Спектр')
+        if self._stationPool:
+            self._stationsWidget = StationsWidget(parent=self, pool=self._stationPool, controller=self._instrumentController)
+            self._ui.tabWidget.addTab(self._stationsWidget, 'Стенды')
+        self._ui.tabWidget.addTab(self._timingWidget, 'Тайминги')
 
         # specific UI tweaks
         self._measureWidget._ui.btnCalibrateLO.hide()
         self._measureWidget._ui.btnCalibrateMod.hide()
         self._measureWidget._ui.btnCalibrateRF.hide()
+        # resuming needs connected instruments and no task running on the controller
+        self._busy = False
+        self._ui.btnResume.setEnabled(False)
 
         self._init()
 
@@ -56,8 +78,12 @@ class MainWindow(QMainWindow):
 
         self._measureWidget.measureStarted.connect(self.on_measureStarted)
         self._measureWidget.measureComplete.connect(self.on_measureComplete)
+        self._measureWidget.busyChanged.connect(self.on_busyChanged)
+
+        self._instrumentController.feed.pointsReady.connect(self.on_points_ready)
 
-        self._instrumentController.pointReady.connect(self.on_point_ready)
+        self._exporter.exportProgress.connect(self.on_export_progress)
+        self._exporter.exportFinished.connect(self.on_export_finished)
 
         self._measureWidget.updateWidgets(self._instrumentController.secondaryParams)
 
@@ -82,17 +108,48 @@ class MainWindow(QMainWindow):
     @pyqtSlot()
     def on_instrumens_connected(self):
         print(f'connected {self._instrumentController}')
+        self._updateResume()
+
+    @pyqtSlot(bool)
+    def on_busyChanged(self, busy):
+        self._busy = busy
+        self._updateResume()
+
+    def _updateResume(self):
+        self._ui.btnResume.setEnabled(self._instrumentController.found and not self._busy)
 
     @pyqtSlot()
     def on_measureComplete(self):
         print('meas complete')
+        # the points still queued are applied before the final redraw from the finished result
+        self._instrumentController.feed.drain()
         self._instrumentController.result._process()
         self._plotWidget.plot()
+        self._timingWidget.refresh()
         self._instrumentController.result.save_adjustment_template()
 
     @pyqtSlot()
     def on_measureStarted(self):
+        self._liveResult.clear()
+        self._plotWidget.clear()
+        self._timingWidget.clear()
+        self._waterfallWidget.clear()
+
+    @pyqtSlot()
+    def on_actOpenRun_triggered(self):
+        if self._busy:
+            self._ui.statusbar.showMessage('Загрузка недоступна во время измерения', 5000)
+            return
+        path = QFileDialog.getExistingDirectory(self, 'Открыть измерение', os.path.join(self._instrumentController.out_path, 'runs'))
+        if not path:
+            return
+
         self._plotWidget.clear()
+        meta = self._instrumentController.result.load_run(path)
+        self._ui.pteditProgress.setPlainText(self._instrumentController.result.report)
+        self._plotWidget.plot()
+        self._instrumentController.hasResult = True
+        print(f'loaded run {path}: {meta.get("device")} {meta.get("started")}')
 
     @pyqtSlot()
     def on_actParams_triggered(self):
@@ -116,20 +173,54 @@ class MainWindow(QMainWindow):
         self._instrumentController.result.only_main_states = only_main_states
         self._plotWidget.only_main_states = only_main_states
 
-    @pyqtSlot()
-    def on_point_ready(self):
-        self._ui.pteditProgress.setPlainText(self._instrumentController.result.report)
-        self._plotWidget.plot()
+    @pyqtSlot(list)
+    def on_points_ready(self, batch):
+        # all points measured since the last frame, one redraw for the lot
+        for payload in batch:
+            self._liveResult.add_payload(payload)
+        main = [p for p in batch if p.kind == 'main']
+        if main:
+            self._ui.pteditProgress.setPlainText(self._liveResult.format_report(main[-1].values))
+        self._plotWidget.plot_changed(self._liveResult)
 
     def closeEvent(self, _):
         self._instrumentController.saveConfigs()
         self._measureWidget.cancel()
+        self._stationPool.shutdown()
+        self._exporter.shutdown()
         while self._measureWidget._threads.activeThreadCount() > 0:
             time.sleep(0.1)
 
+    @pyqtSlot()
+    def on_btnResume_clicked(self):
+        if self._busy or not self._instrumentController.found:
+            return
+        self.on_measureStarted()
+        self._measureWidget.resume()
+
     @pyqtSlot()
     def on_btnExcel_clicked(self):
-        self._instrumentController.result.export_excel()
+        # a second click while a report is being written cancels it
+        if self._exporter.busy:
+            self._exporter.cancel_all()
+            return
+        # the snapshot reads the result, which the measurement thread is writing until the task ends
+        if self._busy:
+            self._ui.statusbar.showMessage('Экспорт недоступен во время измерения', 5000)
+            return
+        file_name = self._exporter.export(self._instrumentController.result)
+        self._ui.btnExcel.setText('Отмена')
+        self._ui.statusbar.showMessage(f'Экспорт {file_name}...')
+
+    @pyqtSlot(str, int, int)
+    def on_export_progress(self, file_name, done, total):
+        self._ui.statusbar.showMessage(f'Экспорт {file_name}: {done} из {total} строк')
+
+    @pyqtSlot(str, bool)
+    def on_export_finished(self, file_name, ok):
+        if not self._exporter.busy:
+            self._ui.btnExcel.setText('в .xlsx')
+        self._ui.statusbar.showMessage(f'Экспорт {file_name}: ' + ('готово' if ok else 'отменён'), 5000)
 
     @pyqtSlot()
     def on_btnScreenShot_clicked(self):
@@ -1,16 +1,24 @@
 import os
+
+from collections import deque
+import numpy as np
 import openpyxl
 import pandas as pd
 
-from collections import defaultdict
-from openpyxl.chart import LineChart, Series, Reference
+import runstorage
+
+from openpyxl.chart import ScatterChart, Series, Reference
 from openpyxl.chart.axis import ChartLines
-from openpyxl.cell import Cell
+from openpyxl.utils import get_column_letter
 from textwrap import dedent
 
-from forgot_again.file import load_ast_if_exists, pprint_to_file, make_dirs, open_explorer_at
+from forgot_again.file import pprint_to_file, make_dirs, open_explorer_at
 from forgot_again.string import now_timestamp
 
+from adjustment import load_adjustment
+from columntable import ColumnTable
+from metrics import TuningMetrics
+
 GIGA = 1_000_000_000
 MEGA = 1_000_000
 KILO = 1_000
@@ -22,52 +30,142 @@ class MeasureResult:
     measurement_name = 'tune'
     path = 'xlsx'
 
-    def __init__(self):
+    # n is the arrival order of a point
+    columns = ['n', 'u_control', 'f_tune', 'p_out', 'i_src']
+    harmonics = (2, 3)
+
+    def __init__(self, track_changes=False):
         self._secondaryParams = dict()
-        self._raw = list()
-        self._raw_x2 = list()
-        self._raw_x3 = list()
 
         self._report = dict()
 
-        self._processed = list()
-        self._processed_x2 = list()
-        self._processed_x3 = list()
+        # u_src -> processed points sorted by u_control
+        self._tables = dict()
+        # multiplier -> u_src -> harmonic readings sorted by u_control
+        self._harmonics = {n: dict() for n in self.harmonics}
 
-        self.ready = False
+        self._metrics = TuningMetrics()
+
+        # (data set, u_src) of the curves changed since the plots last took them,
+        # kept only for a result that is drawn live, None otherwise
+        self._changed = deque() if track_changes else None
 
-        self.data1 = defaultdict(list)
-        self.data2 = defaultdict(list)
-        self.data3 = dict()
-        self.data4 = dict()
-        self.data5 = defaultdict(list)
-        self.data6 = defaultdict(list)
+        self.ready = False
 
-        self.adjustment = load_ast_if_exists('adjust.ini', default=None)
+        # corrections by (u_src, u_control), the file is parsed again only when it changes
+        self.adjustment = load_adjustment('adjust.ini')
 
     def __bool__(self):
         return self.ready
 
     def _process(self):
-        u_src_dict = dict(enumerate(self.data1.keys()))
+        # harmonics are joined to the fundamentals on access, nothing is left to do at the end of a run
+        self.ready = True
 
-        for idx, harm_x2 in enumerate(self._raw_x2):
-            h_x2 = [list(d.values()) for d in harm_x2]
-            h_x2 = _find_deltas(h_x2, self._processed)
-            self.data3[u_src_dict[idx]] = h_x2
-            self._processed_x2.append([[point[0], point[1], raw['read_p']] for point, raw in zip(h_x2, harm_x2)])
+    @property
+    def points(self):
+        return sum(len(t) for t in self._tables.values())
 
-        for idx, harm_x3 in enumerate(self._raw_x3):
-            h_x3 = [list(d.values()) for d in harm_x3]
-            h_x3 = _find_deltas(h_x3, self._processed)
-            self.data4[u_src_dict[idx]] = h_x3
-            self._processed_x3.append([[point[0], point[1], raw['read_p']] for point, raw in zip(h_x3, harm_x3)])
+    # per supply voltage (u_control, value) curves, zero-copy views into the result tables
+    @property
+    def data1(self):
+        return self._curves('f_tune')
 
-        self.ready = True
+    @property
+    def data2(self):
+        return self._curves('p_out')
+
+    @property
+    def data5(self):
+        return self._curves('i_src')
+
+    @property
+    def data6(self):
+        # (f2 - f1) / (u2 - u1) of every segment of the same supply voltage, plotted at u2
+        return {
+            u_src: (m['u_control'][1:], m['kvco'][:-1])
+            for u_src, m in self.metrics['supplies'].items()
+        }
+
+    @property
+    def metrics(self):
+        return self._metrics.get(self._tables)
+
+    @property
+    def data3(self):
+        return self._harmonic_curves(2)
+
+    @property
+    def data4(self):
+        return self._harmonic_curves(3)
+
+    def curve(self, name, u_src):
+        # a single curve of one of the data sets above, without building the others
+        if name == 'data6':
+            m = self._metrics.supply(u_src, self._tables[u_src])
+            return m['u_control'][1:], m['kvco'][:-1]
+        if name in ('data3', 'data4'):
+            _, u_control, p_rel, _ = self._join_harmonic(2 if name == 'data3' else 3, u_src)
+            return u_control, p_rel
+        table = self._tables[u_src]
+        return table.column('u_control'), table.column(_curve_columns[name])
+
+    def take_changed(self):
+        changed = set()
+        while self._changed is not None and self._changed:
+            changed.add(self._changed.popleft())
+        return changed
+
+    def _harmonic_curves(self, multiplier):
+        curves = dict()
+        for u_src in self._harmonics[multiplier]:
+            _, u_control, p_rel, _ = self._join_harmonic(multiplier, u_src)
+            curves[u_src] = (u_control, p_rel)
+        return curves
+
+    def _join_harmonic(self, multiplier, u_src):
+        # harmonic readings of one supply voltage matched to its fundamental by u_control, returns fundamental row,
+        # u_control, level relative to the fundamental and absolute level of the matched readings
+        harm = self._harmonics[multiplier][u_src]
+        u_h = harm.column('u_control')
+        p_h = harm.column('read_p')
+
+        main = self._tables.get(u_src)
+        if main is None or not len(main) or not len(harm):
+            return np.empty(0, dtype=int), np.empty(0), np.empty(0), np.empty(0)
+
+        u_m = main.column('u_control')
+        idx = np.minimum(np.searchsorted(u_m, u_h), len(u_m) - 1)
+        hit = np.isclose(u_m[idx], u_h)
+        return idx[hit], u_h[hit], p_h[hit] - main.column('p_out')[idx[hit]], p_h[hit]
+
+    def _curves(self, column):
+        return {u_src: (table.column('u_control'), table.column(column)) for u_src, table in self._tables.items()}
+
+    def _frame(self):
+        # all points sorted by supply and control voltage
+        frames = [table.to_frame().assign(u_src=u_src) for u_src, table in sorted(self._tables.items())]
+        if not frames:
+            return pd.DataFrame(columns=['u_src'] + self.columns)
+        return pd.concat(frames, ignore_index=True)[['u_src'] + self.columns]
+
+    def add_harmonic_point(self, multiplier, u_src, u_control, read_p):
+        tables = self._harmonics[multiplier]
+        if u_src not in tables:
+            tables[u_src] = ColumnTable(['u_control', 'read_p'], key='u_control')
+        tables[u_src].append({'u_control': u_control, 'read_p': read_p})
+        if self._changed is not None:
+            self._changed.append((f'data{multiplier + 1}', u_src))
 
     def add_harmonics_measurement(self, x2, x3):
-        self._raw_x2 = list(x2)
-        self._raw_x3 = list(x3)
+        # replaces the harmonics with per supply voltage lists of {'u_control', 'read_p'},
+        # in the order the supply voltages were measured
+        u_srcs = list(self._tables.keys())
+        for multiplier, harm in zip(self.harmonics, (x2, x3)):
+            self._harmonics[multiplier].clear()
+            for u_src, points in zip(u_srcs, harm):
+                for point in points:
+                    self.add_harmonic_point(multiplier, u_src, point['u_control'], point['read_p'])
 
     def _process_point(self, data):
         u_src = data['u_src']
@@ -78,11 +176,11 @@ class MeasureResult:
         i_src = data['read_i'] / MILLI
 
         if self.adjustment is not None:
-            point = self.adjustment[len(self._processed)]
-            f_tune += point['f_tune']
-            p_out += point['p_out']
-            i_src += point['i_src']
+            f_tune, p_out, i_src = (float(v[0]) for v in self.adjustment.apply(u_src, u_control, f_tune, p_out, i_src))
+
+        return self._append(u_src, u_control, f_tune, p_out, i_src)
 
+    def _append(self, u_src, u_control, f_tune, p_out, i_src):
         self._report = {
             'u_src': u_src,
             'u_control': u_control,
@@ -91,41 +189,31 @@ class MeasureResult:
             'i_src': i_src,
         }
 
-        self.data1[u_src].append([u_control, f_tune])
-        self.data2[u_src].append([u_control, p_out])
-        self.data5[u_src].append([u_control, i_src])
-
-        if len(self._processed):
-            # (f2 - f1) / (u2 - u1) * 100
-            last_point = self._processed[-1]
-            f1 = last_point['f_tune']
-            f2 = f_tune
-            u1 = last_point['u_control']
-            u2 = u_control
-            tune = (f2 - f1) / (u2 - u1)
-            self.data6[u_src].append([u_control, tune])
-        self._processed.append({**self._report})
+        # points may arrive out of order on an adaptive grid, tables keep them sorted by u_control
+        if u_src not in self._tables:
+            self._tables[u_src] = ColumnTable(self.columns, key='u_control')
+        self._tables[u_src].append({'n': self.points, **self._report})
+        if self._changed is not None:
+            # harmonic levels are relative to the fundamental of the same supply
+            self._changed.extend((name, u_src) for name in ('data1', 'data2', 'data5', 'data6'))
+            for multiplier in self.harmonics:
+                if u_src in self._harmonics[multiplier]:
+                    self._changed.append((f'data{multiplier + 1}', u_src))
+        return self._report
 
     def clear(self):
         self._secondaryParams.clear()
-        self._raw.clear()
-        self._raw_x2.clear()
-        self._raw_x3.clear()
 
         self._report.clear()
 
-        self._processed.clear()
-        self._processed_x2.clear()
-        self._processed_x3.clear()
+        self._tables.clear()
+        for tables in self._harmonics.values():
+            tables.clear()
+        self._metrics.invalidate()
+        if self._changed is not None:
+            self._changed.clear()
 
-        self.data1.clear()
-        self.data2.clear()
-        self.data3.clear()
-        self.data4.clear()
-        self.data5.clear()
-        self.data6.clear()
-
-        self.adjustment = load_ast_if_exists('adjust.ini', default=None)
+        self.adjustment = load_adjustment('adjust.ini')
 
         self.ready = False
 
@@ -133,23 +221,62 @@ class MeasureResult:
         self._secondaryParams = dict(**params.params)
 
     def add_point(self, data):
-        self._raw.append(data)
-        self._process_point(data)
+        # returns the processed point
+        return self._process_point(data)
+
+    def add_payload(self, payload):
+        # an already processed point handed over by the measurement thread, see pointfeed.py,
+        # lets the GUI keep its own copy of the result instead of reading the one being measured into
+        values = payload.values
+        if payload.kind == 'main':
+            self._append(values['u_src'], values['u_control'], values['f_tune'], values['p_out'], values['i_src'])
+        else:
+            self.add_harmonic_point(int(payload.kind[1:]), payload.u_src, payload.u_control, values['read_p'])
+
+    def load_run(self, path):
+        meta, data = runstorage.load_run(path)
+
+        self.clear()
+        self._secondaryParams = dict(meta.get('secondary', dict()))
+
+        # the whole run is converted and corrected at once, then inserted in the original order
+        main = data['main']
+        u_src, u_control = main['u_src'], main['u_control']
+        f_tune, p_out, i_src = main['read_f'] / MEGA, main['read_p'], main['read_i'] / MILLI
+        if self.adjustment is not None and len(u_src):
+            f_tune, p_out, i_src = self.adjustment.apply(u_src, u_control, f_tune, p_out, i_src)
+        for row in zip(u_src.tolist(), u_control.tolist(), f_tune.tolist(), p_out.tolist(), i_src.tolist()):
+            self._append(*row)
+
+        for multiplier in self.harmonics:
+            h = data[f'x{multiplier}']
+            for u_src, u_control, read_p in zip(h['u_src'].tolist(), h['u_control'].tolist(), h['read_p'].tolist()):
+                self.add_harmonic_point(multiplier, u_src, u_control, read_p)
+        self._process()
+        return meta
 
     def save_adjustment_template(self):
         if self.adjustment is None:
             print('measured, saving template')
-            self.adjustment = [{
-                'u_src': p['u_src'],
-                'u_control': p['u_control'],
+            points = self._frame()
+            pprint_to_file('adjust.ini', [{
+                'u_src': u_src,
+                'u_control': u_control,
                 'f_tune': 0,
                 'p_out': 0,
                 'i_src': 0,
-            } for p in self._processed]
-            pprint_to_file('adjust.ini', self.adjustment)
+            } for u_src, u_control in zip(points['u_src'].tolist(), points['u_control'].tolist())])
+            self.adjustment = load_adjustment('adjust.ini')
 
     @property
     def report(self):
+        return self.format_report(self._report)
+
+    def format_report(self, point):
+        # point -- processed readings of the point to show, the characteristics are those of its supply voltage
+        metrics = self.metrics
+        supply = metrics['supplies'].get(point['u_src'], dict())
+        pushing = metrics['pushing']
         return dedent("""        Источник питания:
         Uпит, В={u_src}
         Uупр, В={u_control}
@@ -158,167 +285,193 @@ class MeasureResult:
         Анализатор:
         Fвых, МГц={f_tune:0.3f}
         Pвых, дБм={p_out:0.3f}
-        """.format(**self._report))
 
-    def export_excel(self):
-        make_dirs(self.path)
+        Характеристика при Uпит={u_src}:
+        Диапазон, МГц={range:0.3f}
+        Kvco ср., МГц/В={kvco_mean:0.3f}
+        Нелинейность, %={lin_error_pct:0.2f}
+        Неравномерность Pвых, дБ={flatness:0.3f}
+        Уход от Uпит, МГц/В={pushing:0.3f}
+        """.format(**{
+            'range': np.nan, 'kvco_mean': np.nan, 'lin_error_pct': np.nan, 'flatness': np.nan,
+            **supply,
+            **point,
+            'pushing': pushing['mean'] if pushing else np.nan,
+        }))
+
+    def export_snapshot(self):
+        # copies of everything the report needs, taken on the caller's thread,
+        # the workbook is then written from them while the result may keep changing
         fn = self._secondaryParams.get('file_name', None) or f'{self.device}-{self.measurement_name}-{now_timestamp()}'
-        file_name = f'./{self.path}/{fn}.xlsx'
-
-        u_dr_1, u_dr_2, u_dr_3 = 0, 0, 0
-
-        udrs = list({point['u_src']: 0 for point in self._processed}.keys())
-        try:
-            u_dr_1 = udrs[0]
-            u_dr_2 = udrs[1]
-            u_dr_3 = udrs[2]
-        except IndexError:
-            pass
-
-        df = pd.DataFrame(self._processed)
-        df.columns=['Uпит, В', 'Uупр, В', 'Fвых, МГц', 'Pвых, дБм', 'Iпот, мА', ]
-
-        df['fdiff'] = df.groupby('Uпит, В')['Fвых, МГц'].diff().shift(-1)
-        df['udiff'] = df.groupby('Uпит, В')['Uупр, В'].diff().shift(-1)
-        df['S, МГц/В'] = df[df['fdiff'].notna()].apply(lambda row: (row['fdiff'] / row['udiff']), axis=1)
-        df = df.drop(['fdiff', 'udiff'], axis=1)
-
-        result_harmonics_x2 = []
-        result_harmonics_x3 = []
-        for processed_x2, processed_x3, udr in zip(self._processed_x2, self._processed_x3, [u_dr_1, u_dr_2, u_dr_3]):
-            result_harmonics_x2 += [[udr] + row for row in processed_x2]
-            result_harmonics_x3 += [[udr] + row for row in processed_x3]
 
-        df_harm_2 = pd.DataFrame(result_harmonics_x2, columns=['Uпит, В', 'Uупр, В', 'Pвых_2отн, дБм', 'Pвых_2, дБм'])
-        df_harm_3 = pd.DataFrame(result_harmonics_x3, columns=['Uпит, В', 'Uупр, В', 'Pвых_3отн, дБм', 'Pвых_3, дБм'])
-
-        df = pd.merge(df, df_harm_2, how='left', on=['Uпит, В', 'Uупр, В'])
-        df = pd.merge(df, df_harm_3, how='left', on=['Uпит, В', 'Uупр, В'])
-
-        df['S, МГц/В'] = df['S, МГц/В'].fillna(0)
-
-        df_udr_1 = df[df['Uпит, В'] == u_dr_1]
-        df_udr_2 = df[df['Uпит, В'] == u_dr_2]
-        df_udr_3 = df[df['Uпит, В'] == u_dr_3]
-
-        cols = len(df_udr_1.columns)
-        rows = len(df_udr_1)
-
-        udr_1_s = [df_udr_1.columns.values.tolist()] + df_udr_1.values.tolist()
-        udr_2_s = [df_udr_2.columns.values.tolist()] + (df_udr_2.values.tolist() or [[''] * cols] * rows)
-        udr_3_s = [df_udr_3.columns.values.tolist()] + (df_udr_3.values.tolist() or [[''] * cols] * rows)
-
-        wb = openpyxl.Workbook()
-        ws = wb.active
-
-        out = []
-        for r1, r2, r3 in zip(udr_1_s, udr_2_s, udr_3_s):
-            row = r1 + ['', ''] + r2 + ['', ''] + r3
-            out.append(row)
-
-        for row in out:
-            ws.append(row)
-
-        top_left_cell: Cell = ws.cell(row=rows + 4, column=2)
-        dx = 9
-        dy = 15
-
-        _add_chart(
-            ws=ws,
-            xs=Reference(ws, range_string=f'{ws.title}!B2:B{rows + 1}'),
-            ys=[
-                Reference(ws, range_string=f'{ws.title}!C2:C{rows + 1}'),
-                Reference(ws, range_string=f'{ws.title}!O2:O{rows + 1}'),
-                Reference(ws, range_string=f'{ws.title}!AA2:AA{rows + 1}'),
-            ],
-            title='Диапазон перестройки',
-            loc=top_left_cell.offset(0, 0).coordinate,
-            curve_labels=[f'Uпит = {u_dr_1}В', f'Uпит = {u_dr_2}В', f'Uпит = {u_dr_3}В'],
-            ax_titles=['Uупр, В', 'Fвых, МГц'],
-        )
-
-        _add_chart(
-            ws=ws,
-            xs=Reference(ws, range_string=f'{ws.title}!B2:B{rows + 1}'),
-            ys=[
-                Reference(ws, range_string=f'{ws.title}!D2:D{rows + 1}'),
-                Reference(ws, range_string=f'{ws.title}!P2:P{rows + 1}'),
-                Reference(ws, range_string=f'{ws.title}!AB2:AB{rows + 1}'),
-            ],
-            title='Мощность',
-            loc=top_left_cell.offset(0, dx).coordinate,
-            curve_labels=[f'Uпит = {u_dr_1}В', f'Uпит = {u_dr_2}В', f'Uпит = {u_dr_3}В'],
-            ax_titles=['Uупр, В', 'Pвых, дБм'],
-        )
-
-        _add_chart(
-            ws=ws,
-            xs=Reference(ws, range_string=f'{ws.title}!B2:B{rows + 1}'),
-            ys=[
-                Reference(ws, range_string=f'{ws.title}!G2:G{rows + 1}'),
-                Reference(ws, range_string=f'{ws.title}!S2:S{rows + 1}'),
-                Reference(ws, range_string=f'{ws.title}!AE2:AE{rows + 1}'),
-            ],
-            title='Относительный уровень 2й гармоники',
-            loc=top_left_cell.offset(dy, 0).coordinate,
-            curve_labels=[f'Uпит = {u_dr_1}В', f'Uпит = {u_dr_2}В', f'Uпит = {u_dr_3}В'],
-            ax_titles=['Uупр, В', 'Pвых х2, МГц'],
-        )
-
-        _add_chart(
-            ws=ws,
-            xs=Reference(ws, range_string=f'{ws.title}!B2:B{rows + 1}'),
-            ys=[
-                Reference(ws, range_string=f'{ws.title}!I2:I{rows + 1}'),
-                Reference(ws, range_string=f'{ws.title}!U2:U{rows + 1}'),
-                Reference(ws, range_string=f'{ws.title}!AG2:AG{rows + 1}'),
-            ],
-            title='Относительный уровень 3й гармоники',
-            loc=top_left_cell.offset(dy, dx).coordinate,
-            curve_labels=[f'Uпит = {u_dr_1}В', f'Uпит = {u_dr_2}В', f'Uпит = {u_dr_3}В'],
-            ax_titles=['Uупр, В', 'Pвых х3, МГц'],
-        )
+        metrics = self.metrics
+        blocks = list()
+        for u_src, table in sorted(self._tables.items()):
+            m = metrics['supplies'][u_src]
+            cols = [np.full(len(table), u_src)] + [table.column(name) for name in self.columns[1:]]
+            # S is 0 on the last point of a supply voltage, as in the report before
+            cols += [np.nan_to_num(m['kvco']), m['kvco_smooth'], m['lin_residual']]
+            for multiplier in self.harmonics:
+                rel, abs_ = np.full(len(table), np.nan), np.full(len(table), np.nan)
+                if u_src in self._harmonics[multiplier]:
+                    rows, _, p_rel, p_abs = self._join_harmonic(multiplier, u_src)
+                    rel[rows] = p_rel
+                    abs_[rows] = p_abs
+                cols += [rel, abs_]
+            # one row per point, column_stack copies
+            blocks.append(np.column_stack(cols))
+
+        return {
+            'file_name': f'./{self.path}/{fn}.xlsx',
+            'blocks': blocks,
+            'metrics': metrics,
+        }
 
+    def export_excel(self, open_explorer=True):
+        return write_excel(self.export_snapshot(), open_explorer=open_explorer)
+
+
+_curve_columns = {'data1': 'f_tune', 'data2': 'p_out', 'data5': 'i_src'}
+
+
+export_columns = [
+    'Uпит, В', 'Uупр, В', 'Fвых, МГц', 'Pвых, дБм', 'Iпот, мА',
+    'S, МГц/В', 'Sсгл, МГц/В', 'Нелин., МГц',
+    'Pвых_2отн, дБм', 'Pвых_2, дБм', 'Pвых_3отн, дБм', 'Pвых_3, дБм',
+]
+
+
+def write_excel(snapshot, open_explorer=True, progress=None, token=None, chunk=256):
+    # streams the rows of a snapshot into a write-only workbook, memory use does not depend on the run size,
+    # progress(done, total) is called every chunk rows, a cancelled token stops before anything is saved,
+    # returns the file name, or None when cancelled
+    file_name = snapshot['file_name']
+    blocks = snapshot['blocks']
+    make_dirs(os.path.dirname(file_name))
+
+    # one block of columns per supply voltage, side by side with two empty columns between them,
+    # adaptive grids may give each supply voltage its own number of points
+    u_srcs = [float(block[0, 0]) for block in blocks]
+    cols = len(export_columns)
+    width = cols + 2
+    rows = max((len(block) for block in blocks), default=0)
+
+    wb = openpyxl.Workbook(write_only=True)
+    ws = wb.create_sheet('Sheet')
+
+    header = (export_columns + [''] * 2) * len(blocks)
+    ws.append(header[:-2])
+    empty = [None] * cols
+    for start in range(0, rows, chunk):
+        if token is not None and token.cancelled:
+            return _discard(ws)
+        stop = min(start + chunk, rows)
+        values = list()
+        for block in blocks:
+            part = block[start:stop]
+            cells = part.astype(object)
+            cells[np.isnan(part)] = None
+            values.append(cells.tolist())
+        for row in range(stop - start):
+            out = []
+            for block in values:
+                out += (block[row] if row < len(block) else empty) + [None, None]
+            ws.append(out[:-2])
+        if progress is not None:
+            progress(stop, rows)
+
+    if token is not None and token.cancelled:
+        return _discard(ws)
+
+    # write-only sheets have no cells to offset from, charts are anchored below the data by coordinate
+    top, left = rows + 4, 2
+    dx = 9
+    dy = 15
+
+    def column_refs(name, skip_last=False):
+        # per supply voltage reference to the column of the given name, over that block's own rows
+        refs = []
+        col = export_columns.index(name) + 1
+        for index, block in enumerate(blocks):
+            letter = get_column_letter(index * width + col)
+            last = len(block) + 1 - (1 if skip_last else 0)
+            refs.append(Reference(ws, range_string=f'{ws.title}!{letter}2:{letter}{max(last, 2)}'))
+        return refs
+
+    charts = [
+        ('Fвых, МГц', 'Диапазон перестройки', (0, 0), ['Uупр, В', 'Fвых, МГц'], False),
+        ('Pвых, дБм', 'Мощность', (0, dx), ['Uупр, В', 'Pвых, дБм'], False),
+        ('Iпот, мА', 'Ток потребления', (0, 2 * dx), ['Uупр, В', 'Iпот, мА'], False),
+        ('Pвых_2отн, дБм', 'Относительный уровень 2й гармоники', (dy, 0), ['Uупр, В', 'Pвых х2, МГц'], False),
+        ('Pвых_3отн, дБм', 'Относительный уровень 3й гармоники', (dy, dx), ['Uупр, В', 'Pвых х3, МГц'], False),
+        # the last point of each block has no sensitivity
+        ('S, МГц/В', 'Чувствительность', (dy, 2 * dx), ['Uупр, В', 'S, МГц/В'], True),
+    ]
+    curve_labels = [f'Uпит = {u}В' for u in u_srcs]
+    for name, title, (row, col), ax_titles, skip_last in charts:
         _add_chart(
             ws=ws,
-            xs=Reference(ws, range_string=f'{ws.title}!B2:B{rows + 1}'),
-            ys=[
-                Reference(ws, range_string=f'{ws.title}!E2:E{rows + 1}'),
-                Reference(ws, range_string=f'{ws.title}!Q2:Q{rows + 1}'),
-                Reference(ws, range_string=f'{ws.title}!AC2:AC{rows + 1}'),
-            ],
-            title='Ток потребления',
-            loc=top_left_cell.offset(0, 2 * dx).coordinate,
-            curve_labels=[f'Uпит = {u_dr_1}В', f'Uпит = {u_dr_2}В', f'Uпит = {u_dr_3}В'],
-            ax_titles=['Uупр, В', 'Iпот, мА'],
+            xs=column_refs('Uупр, В', skip_last),
+            ys=column_refs(name, skip_last),
+            title=title,
+            loc=f'{get_column_letter(left + col)}{top + row}',
+            curve_labels=curve_labels,
+            ax_titles=ax_titles,
         )
 
-        _add_chart(
-            ws=ws,
-            xs=Reference(ws, range_string=f'{ws.title}!B2:B{rows}'),
-            ys=[
-                Reference(ws, range_string=f'{ws.title}!F2:F{rows}'),
-                Reference(ws, range_string=f'{ws.title}!R2:R{rows}'),
-                Reference(ws, range_string=f'{ws.title}!AD2:AD{rows}'),
-            ],
-            title='Чувствительность',
-            loc=top_left_cell.offset(dy, 2 * dx).coordinate,
-            curve_labels=[f'Uпит = {u_dr_1}В', f'Uпит = {u_dr_2}В', f'Uпит = {u_dr_3}В'],
-            ax_titles=['Uупр, В', 'S, МГц/В'],
-        )
+    _add_metrics_sheet(wb, snapshot['metrics'])
 
-        wb.save(file_name)
+    wb.save(file_name)
+    if open_explorer:
         open_explorer_at(os.path.abspath(file_name))
+    return file_name
+
+
+def _discard(ws):
+    # ends the sheet's row stream, nothing is saved, openpyxl removes its temp file on exit
+    ws.close()
+    return None
+
+
+def _add_metrics_sheet(wb, metrics):
+    ws = wb.create_sheet('Параметры')
+    columns = [
+        ('Uпит, В', None),
+        ('Fмин, МГц', 'f_min'),
+        ('Fмакс, МГц', 'f_max'),
+        ('Диапазон, МГц', 'range'),
+        ('Kvco ср., МГц/В', 'kvco_mean'),
+        ('Нелин., МГц', 'lin_error'),
+        ('Нелин., %', 'lin_error_pct'),
+        ('Pмин, дБм', 'p_min'),
+        ('Pмакс, дБм', 'p_max'),
+        ('Неравн. Pвых, дБ', 'flatness'),
+    ]
+    ws.append([title for title, _ in columns])
+    for u_src, m in metrics['supplies'].items():
+        ws.append([u_src] + [_cell(m[key]) for _, key in columns[1:]])
+
+    pushing = metrics['pushing']
+    if pushing:
+        ws.append([])
+        ws.append(['Уход от Uпит ср., МГц/В', _cell(pushing['mean'])])
+        ws.append(['Uупр, В', 'Уход от Uпит, МГц/В'])
+        for u, value in zip(pushing['u_control'].tolist(), pushing['pushing'].tolist()):
+            ws.append([u, _cell(value)])
+
+
+def _cell(value):
+    return None if value is None or np.isnan(value) else float(value)
 
 
 def _add_chart(ws, xs, ys, title, loc, curve_labels=None, ax_titles=None):
-    chart = LineChart()
+    # scatter chart, so that every curve is drawn against its own, possibly non-uniform, control voltage grid
+    chart = ScatterChart()
 
-    for y, label in zip(ys, curve_labels):
-        ser = Series(y, title=label)
+    for x, y, label in zip(xs, ys, curve_labels):
+        ser = Series(y, xvalues=x, title=label)
         chart.append(ser)
 
-    chart.set_categories(xs)
     chart.title = title
 
     chart.x_axis.minorGridlines = ChartLines()
@@ -331,6 +484,3 @@ def _add_chart(ws, xs, ys, title, loc, curve_labels=None, ax_titles=None):
 
     ws.add_chart(chart, loc)
 
-
-def _find_deltas(harm, origin):
-    return [[main['u_control'], -(main['p_out'] - harm[1])] for harm, main in zip(harm, origin)]
@@ -6,6 +6,8 @@ from forgot_again.file import remove_if_exists
 
 class MeasureWidgetWithSecondaryParameters(MeasureWidget):
     secondaryChanged = pyqtSignal(dict)
+    # True while a check, measure or resume task is running, for the controls outside this widget
+    busyChanged = pyqtSignal(bool)
 
     def __init__(self, parent=None, controller=None):
         super().__init__(parent=parent, controller=controller)
@@ -21,6 +23,22 @@ class MeasureWidgetWithSecondaryParameters(MeasureWidget):
     def _connectSignals(self):
         self._paramInputWidget.secondaryChanged.connect(self.on_params_changed)
 
+    def _modeDuringCheck(self):
+        super(MeasureWidgetWithSecondaryParameters, self)._modeDuringCheck()
+        self.busyChanged.emit(True)
+
+    def _modeDuringMeasure(self):
+        super(MeasureWidgetWithSecondaryParameters, self)._modeDuringMeasure()
+        self.busyChanged.emit(True)
+
+    def _modePreCheck(self):
+        super(MeasureWidgetWithSecondaryParameters, self)._modePreCheck()
+        self.busyChanged.emit(False)
+
+    def _modePreMeasure(self):
+        super(MeasureWidgetWithSecondaryParameters, self)._modePreMeasure()
+        self.busyChanged.emit(False)
+
     def check(self):
         print('subclass checking...')
         self._modeDuringCheck()
@@ -70,6 +88,17 @@ class MeasureWidgetWithSecondaryParameters(MeasureWidget):
                 [self._selectedDevice, self._params]
             ))
 
+    def resume(self):
+        print('subclass resuming...')
+        self._modeDuringMeasure()
+        self._threads.start(
+            MeasureTask(
+                self._controller.resume,
+                self.measureTaskComplete,
+                self._token,
+                [self._selectedDevice, self._params]
+            ))
+
     def measureTaskComplete(self):
         res = super(MeasureWidgetWithSecondaryParameters, self).measureTaskComplete()
         if not res:
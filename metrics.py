@@ -0,0 +1,119 @@
+import numpy as np
+
+
+class TuningMetrics:
+    # derived characteristics of the tuning curves, computed from the result tables in one pass
+    # and cached until the result changes:
+    #   per supply voltage -- Kvco and its smoothed version, tuning range, linearity error, power flatness
+    #   across supply voltages -- frequency pushing, MHz per volt of supply
+
+    def __init__(self, smooth=5):
+        self._smooth = smooth
+        # u_src -> (row count the metrics were computed for, metrics), tables only ever grow
+        self._supplies = dict()
+        self._metrics = None
+
+    def invalidate(self):
+        self._supplies.clear()
+        self._metrics = None
+
+    def get(self, tables):
+        # tables -- u_src -> ColumnTable with u_control, f_tune (MHz), p_out (dBm) columns sorted by u_control
+        changed = self._metrics is None or set(self._supplies) != set(tables)
+        for u_src, table in tables.items():
+            rows, _ = self._supplies.get(u_src, (None, None))
+            if rows != len(table):
+                self.supply(u_src, table)
+                changed = True
+        for u_src in set(self._supplies) - set(tables):
+            del self._supplies[u_src]
+
+        if changed:
+            supplies = {u_src: self._supplies[u_src][1] for u_src in sorted(tables)}
+            self._metrics = {
+                'supplies': supplies,
+                'pushing': _pushing({u_src: (m['u_control'], m['f_tune']) for u_src, m in supplies.items()}),
+            }
+        return self._metrics
+
+    def supply(self, u_src, table):
+        # metrics of one supply voltage alone, the cross-supply ones are left until the next get()
+        rows, metrics = self._supplies.get(u_src, (None, None))
+        if rows != len(table):
+            metrics = self._supply(table.column('u_control'), table.column('f_tune'), table.column('p_out'))
+            self._supplies[u_src] = (len(table), metrics)
+            self._metrics = None
+        return metrics
+
+    def _supply(self, u, f, p):
+        # copies, table views shift when a point is inserted out of order
+        u, f, p = np.array(u), np.array(f), np.array(p)
+        n = len(u)
+        kvco = np.full(n, np.nan)
+        kvco_smooth = np.full(n, np.nan)
+        lin_residual = np.zeros(n)
+        lin_error = 0.0
+
+        if n > 1:
+            du = np.diff(u)
+            valid = du != 0
+            # forward difference, on the row of the lower point, the last point has none
+            kvco[:-1][valid] = np.diff(f)[valid] / du[valid]
+
+        if n > 2 and np.all(np.diff(u) > 0):
+            kvco_smooth = _moving_average(np.gradient(f, u), self._smooth)
+
+            # deviation from the least squares straight line
+            slope, offset = np.polyfit(u, f, 1)
+            lin_residual = f - (slope * u + offset)
+            lin_error = float(np.abs(lin_residual).max())
+
+        f_min = float(f.min()) if n else np.nan
+        f_max = float(f.max()) if n else np.nan
+        span = f_max - f_min
+        return {
+            'u_control': u,
+            'f_tune': f,
+            'kvco': kvco,
+            'kvco_smooth': kvco_smooth,
+            'kvco_mean': span / (u[-1] - u[0]) if n > 1 and u[-1] != u[0] else np.nan,
+            'f_min': f_min,
+            'f_max': f_max,
+            'range': span,
+            'lin_residual': lin_residual,
+            'lin_error': lin_error,
+            'lin_error_pct': 100 * lin_error / span if n and span else np.nan,
+            'p_min': float(p.min()) if n else np.nan,
+            'p_max': float(p.max()) if n else np.nan,
+            'flatness': float(p.max() - p.min()) if n else np.nan,
+        }
+
+
+def _moving_average(values, window):
+    # centred, the window shrinks at the edges instead of padding
+    if window <= 1 or len(values) < 2:
+        return values
+    kernel = np.ones(min(window, len(values)))
+    return np.convolve(values, kernel, mode='same') / np.convolve(np.ones_like(values), kernel, mode='same')
+
+
+def _pushing(curves):
+    # slope of f vs u_src at every control voltage of the densest grid, least squares over the supplies
+    curves = {u_src: (u, f) for u_src, (u, f) in curves.items() if len(u) > 1}
+    if len(curves) < 2:
+        return None
+
+    grid = max((u for u, _ in curves.values()), key=len)
+    u_srcs = np.array(list(curves.keys()))
+    f = np.array([np.interp(grid, u, fs, left=np.nan, right=np.nan) for u, fs in curves.values()])
+
+    # control voltages outside some supply's grid have no pushing value
+    covered = np.all(np.isfinite(f), axis=0)
+    x = u_srcs - u_srcs.mean()
+    pushing = np.full(len(grid), np.nan)
+    pushing[covered] = (x[:, None] * (f[:, covered] - f[:, covered].mean(axis=0))).sum(axis=0) / (x ** 2).sum()
+    return {
+        'u_control': grid,
+        'pushing': pushing,
+        'mean': float(pushing[covered].mean()) if covered.any() else np.nan,
+    }
@@ -0,0 +1,120 @@
+import os
+import zipfile
+
+import numpy as np
+import pandas as pd
+
+
+class OffsetTable:
+    # frequency (MHz) and power (dB) offsets of a device on a (Vcc, Vctr) grid,
+    # bilinear interpolation between the grid nodes, clamped to the grid edges outside of it
+    columns = ('Freq offs', 'Pow offs')
+
+    def __init__(self, u_src, u_control, values):
+        # u_src, u_control -- sorted grid axes, values -- (2, len(u_src), len(u_control)) array
+        self.u_src = np.asarray(u_src, dtype=float)
+        self.u_control = np.asarray(u_control, dtype=float)
+        self.values = np.asarray(values, dtype=float)
+
+    @classmethod
+    def from_records(cls, rows):
+        # rows of the offset workbook, cells missing from the sheet are filled from their neighbours
+        u_src = np.unique([row['Vcc'] for row in rows])
+        u_control = np.unique([row['Vctr'] for row in rows])
+        values = np.full((len(cls.columns), len(u_src), len(u_control)), np.nan)
+        for row in rows:
+            i = np.searchsorted(u_src, row['Vcc'])
+            j = np.searchsorted(u_control, row['Vctr'])
+            values[:, i, j] = [row[col] for col in cls.columns]
+
+        for plane in values:
+            _fill(plane, u_control)
+            _fill(plane.T, u_src)
+        return cls(u_src, u_control, np.nan_to_num(values))
+
+    def lookup(self, u_src, u_control):
+        # offsets at the given coordinates, scalars or arrays, as a (2, points) array
+        u_src, u_control = np.broadcast_arrays(np.atleast_1d(np.asarray(u_src, dtype=float)), np.atleast_1d(np.asarray(u_control, dtype=float)))
+        (s_lo, s_hi, s_w), (c_lo, c_hi, c_w) = _neighbours(self.u_src, u_src), _neighbours(self.u_control, u_control)
+        v = self.values
+        lo = (1 - c_w) * v[:, s_lo, c_lo] + c_w * v[:, s_lo, c_hi]
+        hi = (1 - c_w) * v[:, s_hi, c_lo] + c_w * v[:, s_hi, c_hi]
+        return (1 - s_w) * lo + s_w * hi
+
+    def __call__(self, u_src, u_control):
+        f_off, p_off = self.lookup(u_src, u_control)[:, 0]
+        return float(f_off), float(p_off)
+
+
+def _fill(plane, axis):
+    # interpolates the missing values of every row of the plane in place along the axis
+    for row in plane:
+        known = ~np.isnan(row)
+        if known.any() and not known.all():
+            row[~known] = np.interp(axis[~known], axis[known], row[known])
+
+
+def _neighbours(axis, x):
+    # lower and upper grid index and the weight of the upper one
+    lo = np.clip(np.searchsorted(axis, x, side='right') - 1, 0, len(axis) - 1)
+    hi = np.minimum(lo + 1, len(axis) - 1)
+    span = axis[hi] - axis[lo]
+    w = np.clip(np.divide(x - axis[lo], span, out=np.zeros_like(x), where=span != 0), 0, 1)
+    return lo, hi, w
+
+
+# path -> (mtime, table) for the tables already loaded in this process
+_cache = dict()
+
+
+def load_offsets(file):
+    # the workbook is parsed once, the table is kept next to it in a .npz keyed by the workbook's mtime,
+    # returns None when there is no offset file for the device
+    try:
+        mtime = os.stat(file).st_mtime_ns
+    except OSError:
+        _cache.pop(file, None)
+        return None
+
+    cached = _cache.get(file)
+    if cached is not None and cached[0] == mtime:
+        return cached[1]
+
+    table = _load_npz(file, mtime)
+    if table is None:
+        print(f'found {file}, load offsets')
+        table = OffsetTable.from_records(pd.read_excel(file, engine='openpyxl').to_dict('records'))
+        _save_npz(file, mtime, table)
+
+    _cache[file] = (mtime, table)
+    return table
+
+
+def _npz_file(file):
+    return f'{file}.npz'
+
+
+def _load_npz(file, mtime):
+    try:
+        with np.load(_npz_file(file)) as data:
+            if int(data['mtime']) != mtime:
+                return None
+            return OffsetTable(data['u_src'], data['u_control'], data['values'])
+    except (OSError, KeyError, ValueError, zipfile.BadZipFile):
+        # a missing, stale or damaged cache, the workbook gets parsed again
+        return None
+
+
+def _save_npz(file, mtime, table):
+    # written aside and moved into place, an interrupted write never leaves a truncated cache behind
+    temp = f'{_npz_file(file)}.tmp'
+    try:
+        with open(temp, mode='wb') as f:
+            np.savez(f, mtime=np.int64(mtime), u_src=table.u_src, u_control=table.u_control, values=table.values)
+        os.replace(temp, _npz_file(file))
+    except OSError as ex:
+        print(f'{file}: could not cache offsets:', ex)
+        try:
+            os.remove(temp)
+        except OSError:
+            pass
@@ -0,0 +1,79 @@
+import time
+
+from collections import deque, namedtuple
+from types import MappingProxyType
+
+from PyQt5.QtCore import QCoreApplication, QObject, QTimer, pyqtSignal
+
+# one measured point as handed from the measurement thread to the GUI,
+# kind -- 'main', 'x2' or 'x3', values -- read-only mapping of the processed readings
+PointPayload = namedtuple('PointPayload', ['kind', 'u_src', 'u_control', 'values', 'done', 'total'])
+
+
+def make_payload(kind, u_src, u_control, values, done, total):
+    return PointPayload(kind, u_src, u_control, MappingProxyType(dict(values)), done, total)
+
+
+class PointFeed(QObject):
+    # points queue up without blocking the measurement, the GUI takes them in batches at a fixed frame rate,
+    # a burst of points costs one redraw instead of one per point
+    pointsReady = pyqtSignal(list)
+
+    def __init__(self, parent=None, fps=30):
+        super().__init__(parent=parent)
+
+        self._queue = deque()
+        self.interval = 1 / fps
+        # without an event loop (scripts, benchmark) push() itself delivers a batch once a frame is due
+        self.synchronous = QCoreApplication.instance() is None
+        self._last = 0.0
+
+        self._timer = QTimer(self)
+        self._timer.setInterval(int(self.interval * 1000))
+        self._timer.timeout.connect(self.drain)
+        if not self.synchronous:
+            self._timer.start()
+
+    def __len__(self):
+        return len(self._queue)
+
+    def push(self, payload):
+        self._queue.append(payload)
+        if self.synchronous and time.perf_counter() - self._last >= self.interval:
+            self.drain()
+
+    def drain(self):
+        self._last = time.perf_counter()
+        batch = list()
+        while self._queue:
+            batch.append(self._queue.popleft())
+        if batch:
+            self.pointsReady.emit(batch)
+        return batch
+
+    def clear(self):
+        self._queue.clear()
+
+
+class TraceFeed:
+    # analyzer traces on their way to the waterfall, the arrays are passed as they came from the reader, not copied,
+    # a bounded queue: when the GUI falls behind the oldest traces are dropped instead of holding up the sweep
+
+    def __init__(self, depth=64):
+        self._queue = deque(maxlen=depth)
+        self.dropped = 0
+
+    def push(self, trace, f_start, f_stop):
+        if len(self._queue) == self._queue.maxlen:
+            self.dropped += 1
+        self._queue.append((trace, f_start, f_stop))
+
+    def take(self):
+        batch = list()
+        while self._queue:
+            batch.append(self._queue.popleft())
+        return batch
+
+    def clear(self):
+        self._queue.clear()
+        self.dropped = 0
@@ -1,3 +1,4 @@
+import numpy as np
 import pyqtgraph as pg
 
 from PyQt5.QtWidgets import QGridLayout, QWidget, QLabel
@@ -7,12 +8,16 @@ from PyQt5.QtCore import Qt
 # https://www.learnpyqt.com/tutorials/plotting-pyqtgraph/
 # https://pyqtgraph.readthedocs.io/en/latest/introduction.html#what-is-pyqtgraph
 
-colors = ['#1f77b4', '#ff7f0e', '#2ca02c', '#d62728', '#9467bd', '#8c564b', '#e377c2', '#7f7f7f', '#bcbd22', '#17becf',
-          '#1f77b4', '#ff7f0e', '#2ca02c', '#d62728', '#9467bd', '#8c564b', '#e377c2', '#7f7f7f', '#bcbd22', '#17becf']
+
+def curve_color(index):
+    # golden ratio hue steps: any number of supply voltages gets distinct colours that do not change as curves are added
+    return pg.hsvColor((0.6 + index * 0.618033988749895) % 1.0, sat=0.85, val=0.85).name()
 
 
 class PrimaryPlotWidget(QWidget):
     label_style = {'color': 'k', 'font-size': '15px'}
+    # points in view of a plot above which it switches to the low detail rendering
+    lod_points = 500
 
     def __init__(self, parent=None, controller=None):
         super().__init__(parent)
@@ -53,11 +58,6 @@ class PrimaryPlotWidget(QWidget):
         self._vb_00 = self._plot_00.vb
         rect = self._vb_00.viewRect()
         self._plot_00.addLegend(offset=(rect.x() + 30, rect.y() + 30))
-        self._vLine_00 = pg.InfiniteLine(angle=90, movable=False)
-        self._hLine_00 = pg.InfiniteLine(angle=0, movable=False)
-        self._plot_00.addItem(self._vLine_00, ignoreBounds=True)
-        self._plot_00.addItem(self._hLine_00, ignoreBounds=True)
-        self._proxy_00 = pg.SignalProxy(self._plot_00.scene().sigMouseMoved, rateLimit=60, slot=self.mouseMoved_00)
 
         self._plot_01.setLabel('left', 'Pвых, дБм', **self.label_style)
         self._plot_01.setLabel('bottom', 'Uупр, В', **self.label_style)
@@ -67,11 +67,6 @@ class PrimaryPlotWidget(QWidget):
         self._vb_01 = self._plot_01.vb
         rect = self._vb_01.viewRect()
         self._plot_01.addLegend(offset=(rect.x() + rect.width() - 50, rect.y() + 30))
-        self._vLine_01 = pg.InfiniteLine(angle=90, movable=False)
-        self._hLine_01 = pg.InfiniteLine(angle=0, movable=False)
-        self._plot_01.addItem(self._vLine_01, ignoreBounds=True)
-        self._plot_01.addItem(self._hLine_01, ignoreBounds=True)
-        self._proxy_01 = pg.SignalProxy(self._plot_01.scene().sigMouseMoved, rateLimit=60, slot=self.mouseMoved_01)
 
         self._plot_02.setLabel('left', 'Iп, ма', **self.label_style)
         self._plot_02.setLabel('bottom', 'Uупр, В', **self.label_style)
@@ -81,11 +76,6 @@ class PrimaryPlotWidget(QWidget):
         self._vb_02 = self._plot_02.vb
         rect = self._vb_02.viewRect()
         self._plot_02.addLegend(offset=(rect.x() + rect.width() - 50, rect.y() + 30))
-        self._vLine_02 = pg.InfiniteLine(angle=90, movable=False)
-        self._hLine_02 = pg.InfiniteLine(angle=0, movable=False)
-        self._plot_02.addItem(self._vLine_02, ignoreBounds=True)
-        self._plot_02.addItem(self._hLine_02, ignoreBounds=True)
-        self._proxy_02 = pg.SignalProxy(self._plot_02.scene().sigMouseMoved, rateLimit=60, slot=self.mouseMoved_02)
 
         self._plot_10.setLabel('left', 'P гарм 2 отн', **self.label_style)
         self._plot_10.setLabel('bottom', 'Uупр, В', **self.label_style)
@@ -95,11 +85,6 @@ class PrimaryPlotWidget(QWidget):
         self._vb_10 = self._plot_10.vb
         rect = self._vb_10.viewRect()
         self._plot_10.addLegend(offset=(rect.x() + rect.width() - 50, rect.y() + 30))
-        self._vLine_10 = pg.InfiniteLine(angle=90, movable=False)
-        self._hLine_10 = pg.InfiniteLine(angle=0, movable=False)
-        self._plot_10.addItem(self._vLine_10, ignoreBounds=True)
-        self._plot_10.addItem(self._hLine_10, ignoreBounds=True)
-        self._proxy_10 = pg.SignalProxy(self._plot_10.scene().sigMouseMoved, rateLimit=60, slot=self.mouseMoved_10)
 
         self._plot_11.setLabel('left', 'P гарм 3 отн', **self.label_style)
         self._plot_11.setLabel('bottom', 'Uупр, В', **self.label_style)
@@ -109,11 +94,6 @@ class PrimaryPlotWidget(QWidget):
         self._vb_11 = self._plot_11.vb
         rect = self._vb_11.viewRect()
         self._plot_11.addLegend(offset=(rect.x() + rect.width() - 50, rect.y() + 30))
-        self._vLine_11 = pg.InfiniteLine(angle=90, movable=False)
-        self._hLine_11 = pg.InfiniteLine(angle=0, movable=False)
-        self._plot_11.addItem(self._vLine_11, ignoreBounds=True)
-        self._plot_11.addItem(self._hLine_11, ignoreBounds=True)
-        self._proxy_11 = pg.SignalProxy(self._plot_11.scene().sigMouseMoved, rateLimit=60, slot=self.mouseMoved_11)
 
         self._plot_12.setLabel('left', 'Чувств., МГц/В', **self.label_style)
         self._plot_12.setLabel('bottom', 'Uупр, В', **self.label_style)
@@ -123,109 +103,30 @@ class PrimaryPlotWidget(QWidget):
         self._vb_12 = self._plot_12.vb
         rect = self._vb_12.viewRect()
         self._plot_12.addLegend(offset=(rect.x() + rect.width() - 50, rect.y() + 30))
-        self._vLine_12 = pg.InfiniteLine(angle=90, movable=False)
-        self._hLine_12 = pg.InfiniteLine(angle=0, movable=False)
-        self._plot_12.addItem(self._vLine_12, ignoreBounds=True)
-        self._plot_12.addItem(self._hLine_12, ignoreBounds=True)
-        self._proxy_12 = pg.SignalProxy(self._plot_12.scene().sigMouseMoved, rateLimit=60, slot=self.mouseMoved_12)
-
-        self.setLayout(self._grid)
-
-    def mouseMoved_00(self, event):
-        pos = event[0]
-        if self._plot_00.sceneBoundingRect().contains(pos):
-            mouse_point = self._vb_00.mapSceneToView(pos)
-            x = mouse_point.x()
-            y = mouse_point.y()
-            self._vLine_00.setPos(x)
-            self._hLine_00.setPos(y)
-            if not self._curves_00:
-                return
-
-            self._stat_label.setText(_label_text(x, y, [
-                [p, curve.yData[_find_value_index(curve.xData, x)]]
-                for p, curve in self._curves_00.items()
-            ]))
-
-    def mouseMoved_01(self, event):
-        pos = event[0]
-        if self._plot_01.sceneBoundingRect().contains(pos):
-            mouse_point = self._vb_01.mapSceneToView(pos)
-            x = mouse_point.x()
-            y = mouse_point.y()
-            self._vLine_01.setPos(x)
-            self._hLine_01.setPos(y)
-            if not self._curves_01:
-                return
-
-            self._stat_label.setText(_label_text(x, y, [
-                [p, curve.yData[_find_value_index(curve.xData, x)]]
-                for p, curve in self._curves_01.items()
-            ]))
-
-    def mouseMoved_02(self, event):
-        pos = event[0]
-        if self._plot_02.sceneBoundingRect().contains(pos):
-            mouse_point = self._vb_02.mapSceneToView(pos)
-            x = mouse_point.x()
-            y = mouse_point.y()
-            self._vLine_02.setPos(x)
-            self._hLine_02.setPos(y)
-            if not self._curves_02:
-                return
-
-            self._stat_label.setText(_label_text(x, y, [
-                [p, curve.yData[_find_value_index(curve.xData, x)]]
-                for p, curve in self._curves_02.items()
-            ]))
 
-    def mouseMoved_10(self, event):
-        pos = event[0]
-        if self._plot_10.sceneBoundingRect().contains(pos):
-            mouse_point = self._vb_10.mapSceneToView(pos)
-            x = mouse_point.x()
-            y = mouse_point.y()
-            self._vLine_10.setPos(x)
-            self._hLine_10.setPos(y)
-            if not self._curves_10:
-                return
+        # result data set -> the curves and the plot it is drawn on
+        self._datasets = {
+            'data1': (self._curves_00, self._plot_00),
+            'data2': (self._curves_01, self._plot_01),
+            'data5': (self._curves_02, self._plot_02),
+            'data3': (self._curves_10, self._plot_10),
+            'data4': (self._curves_11, self._plot_11),
+            'data6': (self._curves_12, self._plot_12),
+        }
+
+        # all plots share the control voltage axis, the vertical cursor follows the mouse on every one of them
+        self._cursor = CursorReadout(self._stat_label, self._win.scene(), [
+            (self._plot_00, self._curves_00),
+            (self._plot_01, self._curves_01),
+            (self._plot_02, self._curves_02),
+            (self._plot_10, self._curves_10),
+            (self._plot_11, self._curves_11),
+            (self._plot_12, self._curves_12),
+        ])
+
+        self._lod = LevelOfDetail([(plot, curves) for curves, plot in self._datasets.values()], limit=self.lod_points)
 
-            self._stat_label.setText(_label_text(x, y, [
-                [p, curve.yData[_find_value_index(curve.xData, x)]]
-                for p, curve in self._curves_10.items()
-            ]))
-
-    def mouseMoved_11(self, event):
-        pos = event[0]
-        if self._plot_11.sceneBoundingRect().contains(pos):
-            mouse_point = self._vb_11.mapSceneToView(pos)
-            x = mouse_point.x()
-            y = mouse_point.y()
-            self._vLine_11.setPos(x)
-            self._hLine_11.setPos(y)
-            if not self._curves_11:
-                return
-
-            self._stat_label.setText(_label_text(x, y, [
-                [p, curve.yData[_find_value_index(curve.xData, x)]]
-                for p, curve in self._curves_11.items()
-            ]))
-
-    def mouseMoved_12(self, event):
-        pos = event[0]
-        if self._plot_12.sceneBoundingRect().contains(pos):
-            mouse_point = self._vb_12.mapSceneToView(pos)
-            x = mouse_point.x()
-            y = mouse_point.y()
-            self._vLine_12.setPos(x)
-            self._hLine_12.setPos(y)
-            if not self._curves_11:
-                return
-
-            self._stat_label.setText(_label_text(x, y, [
-                [p, curve.yData[_find_value_index(curve.xData, x)]]
-                for p, curve in self._curves_12.items()
-            ]))
+        self.setLayout(self._grid)
 
     def clear(self):
         def _remove_curves(plot, curve_dict):
@@ -246,45 +147,157 @@ class PrimaryPlotWidget(QWidget):
         self._curves_11.clear()
         self._curves_12.clear()
 
-    def plot(self):
+    def plot(self, result=None):
+        # redraws every curve, for a finished or loaded run, the controller's result by default,
+        # which must not be in the middle of a sweep
         print('plotting primary stats')
-        _plot_curves(self._controller.result.data1, self._curves_00, self._plot_00, prefix='Uпит= ', suffix=' В')
-        _plot_curves(self._controller.result.data2, self._curves_01, self._plot_01, prefix='Uпит= ', suffix=' В')
-        _plot_curves(self._controller.result.data5, self._curves_02, self._plot_02, prefix='Uпит= ', suffix=' В')
-        _plot_curves(self._controller.result.data3, self._curves_10, self._plot_10, prefix='Uпит= ', suffix=' В')
-        _plot_curves(self._controller.result.data4, self._curves_11, self._plot_11, prefix='Uпит= ', suffix=' В')
-        _plot_curves(self._controller.result.data6, self._curves_12, self._plot_12, prefix='Uпит= ', suffix=' В')
-
-
-def _plot_curves(datas, curves, plot, prefix='', suffix=''):
-    for pow_lo, data in datas.items():
-        curve_xs, curve_ys = zip(*data)
-        try:
-            curves[pow_lo].setData(x=curve_xs, y=curve_ys)
-        except KeyError:
-            try:
-                color = colors[len(curves)]
-            except IndexError:
-                color = colors[len(curves) - len(colors)]
-            curves[pow_lo] = pg.PlotDataItem(
-                curve_xs,
-                curve_ys,
-                pen=pg.mkPen(
-                    color=color,
-                    width=2,
-                ),
-                symbol='o',
-                symbolSize=5,
-                symbolBrush=color,
-                name=f'{prefix}{pow_lo}{suffix}'
-            )
-            plot.addItem(curves[pow_lo])
+        if result is None:
+            result = self._controller.result
+        result.take_changed()
+        for name, (curves, plot) in self._datasets.items():
+            new = [
+                _set_curve(curves, plot, u_src, curve_xs, curve_ys, prefix='Uпит= ', suffix=' В')
+                for u_src, (curve_xs, curve_ys) in getattr(result, name).items()
+            ]
+            self._lod.update(plot, curves, [curve for curve in new if curve is not None])
+
+    def plot_changed(self, result):
+        # live path: only the curves that got new points since the last call are pushed to pyqtgraph,
+        # the per-point cost does not grow with the number of supply voltages already measured,
+        # result -- one owned by this thread, filled from the point payloads
+        new = dict()
+        for name, u_src in result.take_changed():
+            curves, plot = self._datasets[name]
+            curve_xs, curve_ys = result.curve(name, u_src)
+            curve = _set_curve(curves, plot, u_src, curve_xs, curve_ys, prefix='Uпит= ', suffix=' В')
+            new.setdefault(name, list())
+            if curve is not None:
+                new[name].append(curve)
+        for name, curves in new.items():
+            self._lod.update(self._datasets[name][1], self._datasets[name][0], curves)
+
+
+def _set_curve(curves, plot, key, curve_xs, curve_ys, prefix='', suffix=''):
+    # the data are views into the result's growable column buffers, nothing is copied here,
+    # returns the curve if it was created
+    if not len(curve_xs):
+        return None
+    try:
+        curves[key].setData(x=curve_xs, y=curve_ys)
+        return None
+    except KeyError:
+        color = curve_color(len(curves))
+        curves[key] = pg.PlotDataItem(
+            curve_xs,
+            curve_ys,
+            pen=pg.mkPen(
+                color=color,
+                width=2,
+            ),
+            symbol='o',
+            symbolSize=5,
+            symbolBrush=color,
+            name=f'{prefix}{key}{suffix}'
+        )
+        plot.addItem(curves[key])
+        return curves[key]
+
+
+class LevelOfDetail:
+    # plots with more than limit points in view drop the markers and switch their curves
+    # to peak-preserving downsampling and clipping to the visible range, zooming in below the limit
+    # restores the full detail, so the drawing cost is bounded by the screen rather than by the data
+
+    def __init__(self, plots, limit=500):
+        # plots -- (plot item, curves dict) pairs
+        self.limit = limit
+        self._dense = dict()
+        for plot, curves in plots:
+            self._dense[plot] = False
+            plot.sigXRangeChanged.connect(lambda *_, plot=plot, curves=curves: self.update(plot, curves))
+
+    def update(self, plot, curves, new=()):
+        # new -- curves just created, they get the plot's current mode even if it does not change
+        x0, x1 = plot.vb.viewRange()[0]
+        visible = 0
+        for curve in curves.values():
+            xs = curve.xData
+            if xs is not None:
+                visible += int(np.searchsorted(xs, x1, side='right') - np.searchsorted(xs, x0, side='left'))
+
+        dense = visible > self.limit
+        if dense != self._dense[plot]:
+            self._dense[plot] = dense
+            new = curves.values()
+        for curve in new:
+            _apply_detail(curve, dense)
+
+
+def _apply_detail(curve, dense):
+    if dense:
+        curve.setDownsampling(auto=True, method='peak')
+        curve.setClipToView(True)
+        curve.setSymbol(None)
+    else:
+        curve.setDownsampling(ds=1, auto=False)
+        curve.setClipToView(False)
+        curve.setSymbol('o')
+
+
+class CursorReadout:
+    # crosshair over a set of plots with one mouse handler for the whole scene,
+    # the readout shows every curve of the hovered plot interpolated at the cursor,
+    # with sync on the vertical line is moved on all the plots together
+
+    def __init__(self, label, scene, plots, sync=True):
+        # plots -- (plot item, curves dict) pairs, curves must be sorted by x, as the result keeps them
+        self.sync = sync
+        self._label = label
+        self._plots = list()
+        for plot, curves in plots:
+            v_line = pg.InfiniteLine(angle=90, movable=False)
+            h_line = pg.InfiniteLine(angle=0, movable=False)
+            plot.addItem(v_line, ignoreBounds=True)
+            plot.addItem(h_line, ignoreBounds=True)
+            self._plots.append((plot, curves, v_line, h_line))
+        self._proxy = pg.SignalProxy(scene.sigMouseMoved, rateLimit=60, slot=self.mouseMoved)
+
+    def mouseMoved(self, event):
+        pos = event[0]
+        for plot, curves, v_line, h_line in self._plots:
+            if not plot.sceneBoundingRect().contains(pos):
+                continue
 
+            mouse_point = plot.vb.mapSceneToView(pos)
+            x = mouse_point.x()
+            y = mouse_point.y()
+            if self.sync:
+                for _, _, other, _ in self._plots:
+                    other.setPos(x)
+            v_line.setPos(x)
+            h_line.setPos(y)
+            if not curves:
+                return
+
+            self._label.setText(_label_text(x, y, [
+                [p, _value_at(curve.xData, curve.yData, x)]
+                for p, curve in curves.items()
+            ]))
+            return
 
-def _label_text(x, y, vals):
-    vals_str = ''.join(f'   <span style="color:{colors[i]}">{p:0.1f}={v:0.2f}</span>' for i, (p, v) in enumerate(vals))
-    return f"<span style='font-size: 8pt'>x={x:0.2f},   y={y:0.2f}   {vals_str}</span>"
 
+def _value_at(xs, ys, x):
+    # linear interpolation between the two points around x, the end values outside of the curve
+    i = int(np.searchsorted(xs, x))
+    if i <= 0:
+        return ys[0]
+    if i >= len(xs):
+        return ys[-1]
+    x0, x1 = xs[i - 1], xs[i]
+    w = (x - x0) / (x1 - x0) if x1 != x0 else 0.0
+    return ys[i - 1] + w * (ys[i] - ys[i - 1])
 
-def _find_value_index(freqs: list, freq):
-    return min(range(len(freqs)), key=lambda i: abs(freqs[i] - freq))
+
+def _label_text(x, y, vals):
+    vals_str = ''.join(f'   <span style="color:{curve_color(i)}">{p:0.2f}={v:0.2f}</span>' for i, (p, v) in enumerate(vals))
+    return f"<span style='font-size: 8pt'>x={x:0.2f},   y={y:0.2f}   {vals_str}</span>"
@@ -0,0 +1,90 @@
+import json
+import os
+
+import numpy as np
+
+from forgot_again.file import make_dirs
+from forgot_again.string import now_timestamp
+
+from timing import account
+
+# one little-endian float64 file per column, rows are appended as points arrive
+tables = {
+    'main': ['u_src', 'u_control', 'read_f', 'read_p', 'read_i'],
+    'x2': ['u_src', 'u_control', 'read_p'],
+    'x3': ['u_src', 'u_control', 'read_p'],
+}
+dtype = np.dtype('<f8')
+
+
+class RunWriter:
+    def __init__(self, path, meta):
+        self._path = path
+        make_dirs(path)
+
+        self._meta = {
+            'format': 1,
+            'dtype': dtype.str,
+            'tables': tables,
+            'started': now_timestamp(),
+            **meta,
+        }
+        self._write_meta()
+
+        self._rows = {table: 0 for table in tables}
+        self._files = {
+            table: {col: open(_column_file(path, table, col), mode='wb') for col in cols}
+            for table, cols in tables.items()
+        }
+
+    @property
+    def path(self):
+        return self._path
+
+    def append(self, table, point):
+        with account.measure('storage'):
+            for col, f in self._files[table].items():
+                f.write(dtype.type(point[col]).tobytes())
+                f.flush()
+        self._rows[table] += 1
+
+    def close(self, finished=True):
+        if not self._files:
+            return
+        for cols in self._files.values():
+            for f in cols.values():
+                f.close()
+        self._files.clear()
+
+        self._meta['rows'] = self._rows
+        if finished:
+            self._meta['finished'] = now_timestamp()
+        self._write_meta()
+
+    def _write_meta(self):
+        with open(os.path.join(self._path, 'meta.json'), mode='wt', encoding='utf-8') as f:
+            json.dump(self._meta, f, ensure_ascii=False, indent=1)
+
+
+def load_run(path):
+    # returns run metadata and {table: {column: read-only memory-mapped array}}
+    with open(os.path.join(path, 'meta.json'), mode='rt', encoding='utf-8') as f:
+        meta = json.load(f)
+
+    data = dict()
+    for table, cols in meta['tables'].items():
+        data[table] = {col: _map_column(_column_file(path, table, col)) for col in cols}
+        # an unfinished run may have a partial last row, cut every column to the shortest one
+        rows = min(len(v) for v in data[table].values())
+        data[table] = {col: v[:rows] for col, v in data[table].items()}
+    return meta, data
+
+
+def _map_column(file_name):
+    if not os.path.isfile(file_name) or os.path.getsize(file_name) < dtype.itemsize:
+        return np.empty(0, dtype=dtype)
+    return np.memmap(file_name, dtype=dtype, mode='r', shape=(os.path.getsize(file_name) // dtype.itemsize, ))
+
+
+def _column_file(path, table, col):
+    return os.path.join(path, f'{table}.{col}.f8')
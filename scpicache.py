@@ -0,0 +1,101 @@
+class CachedInstrument:
+    # writes to setting headers that the instrument already holds are dropped,
+    # the rest is buffered and sent as one ';'-joined message on the next query or flush
+
+    # writing a header changes the instrument-side value of the listed headers,
+    # pending writes are never reordered or merged across a coupled one,
+    # the frequency settings are given in the frame of the display offset in effect when they are written
+    coupled = {
+        'SENS:FREQ:STAR': {'SENS:FREQ:CENT', 'SENS:FREQ:SPAN', 'DISP:WIND:TRAC:X:OFFS'},
+        'SENS:FREQ:STOP': {'SENS:FREQ:CENT', 'SENS:FREQ:SPAN', 'DISP:WIND:TRAC:X:OFFS'},
+        'SENS:FREQ:CENT': {'SENS:FREQ:STAR', 'SENS:FREQ:STOP', 'DISP:WIND:TRAC:X:OFFS'},
+        'SENS:FREQ:SPAN': {'SENS:FREQ:STAR', 'SENS:FREQ:STOP', 'DISP:WIND:TRAC:X:OFFS'},
+        'DISP:WIND:TRAC:X:OFFS': {'SENS:FREQ:STAR', 'SENS:FREQ:STOP', 'SENS:FREQ:CENT', 'SENS:FREQ:SPAN'},
+        'DISP:WIND:TRAC:Y:RLEV:OFFS': {'DISP:WIND:TRAC:Y:RLEV'},
+    }
+    max_pending = 16
+
+    def __init__(self, inst, channel_headers=()):
+        self._inst = inst
+        self._channel_headers = {h.upper() for h in channel_headers}
+        self._state = dict()
+        self._pending = list()
+
+        self.sent = 0
+        self.dropped = 0
+
+    def __getattr__(self, item):
+        return getattr(self._inst, item)
+
+    def __str__(self):
+        return f'{self._inst}'
+
+    def send(self, cmd):
+        key, value = self._parse(cmd)
+
+        if key is None:
+            if cmd.strip().upper() == '*RST':
+                self._state.clear()
+        else:
+            if self._state.get(key) == value:
+                self.dropped += 1
+                return
+            self._drop_pending(key)
+            for k in self._coupled_with(key):
+                self._state.pop(k, None)
+            self._state[key] = value
+
+        self._pending.append((key, cmd))
+        if len(self._pending) >= self.max_pending:
+            self.flush()
+
+    def query(self, cmd):
+        msg = self._join([c for _, c in self._pending] + [cmd])
+        self._pending.clear()
+        self.sent += 1
+        return self._inst.query(msg)
+
+    def flush(self):
+        if not self._pending:
+            return
+        msg = self._join([c for _, c in self._pending])
+        self._pending.clear()
+        self.sent += 1
+        self._inst.send(msg)
+
+    def invalidate(self):
+        self._state.clear()
+
+    def _parse(self, cmd):
+        # setting commands are the ones with arguments, everything else is an event or a query
+        header, _, args = cmd.strip().partition(' ')
+        header = header.lstrip(':').upper()
+        if header.startswith('*') or not args:
+            return None, None
+        args = args.strip()
+        if header in self._channel_headers:
+            channel, _, args = args.partition(',')
+            header = f'{header} {channel.strip().upper()}'
+        return header, args.upper()
+
+    def _coupled_with(self, key):
+        return self.coupled.get(key, set())
+
+    def _drop_pending(self, key):
+        # the last pending write of the same setting is superseded, unless an event
+        # or a coupled setting was queued after it
+        coupled = self._coupled_with(key)
+        for i in range(len(self._pending) - 1, -1, -1):
+            k, _ = self._pending[i]
+            if k == key:
+                del self._pending[i]
+                self.dropped += 1
+                return
+            if k is None or k in coupled or key in self._coupled_with(k):
+                return
+
+    @staticmethod
+    def _join(cmds):
+        if len(cmds) == 1:
+            return cmds[0]
+        return ';'.join(c if c.startswith((':', '*')) else f':{c}' for c in cmds)
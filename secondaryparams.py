@@ -23,4 +23,6 @@ class SecondaryParams:
         return dict(**self._required)
 
     def load_from_config(self, file):
-        self.params = load_ast_if_exists(file, default=self.params)
+        # keep defaults for params added after the config was saved, drop the retired ones
+        loaded = load_ast_if_exists(file, default=self.params)
+        self.params = {**self.params, **{k: v for k, v in loaded.items() if k in self._required}}
@@ -0,0 +1,161 @@
+import time
+
+from instr.instrumentfactory import mock_enabled
+from timing import account, trace
+
+
+class SettleEngine:
+    # delay -- fixed wait used when adaptive settling is off (legacy timings)
+    # repeat -- legacy only, the peak search is run again after delay and read after this wait
+    # min -- dwell before the first poll in adaptive mode
+    # timeout -- adaptive poll cap, the last reading is used after it expires
+    defaults = {
+        'adaptive': True,
+        'use_opc': True,
+        'f_tol': 100_000.0,   # Hz
+        'p_tol': 0.2,         # dB
+        'poll': 0.05,         # s
+        'readings': 2,
+        'time_scale': 1.0,
+        'steps': {
+            'source': {'delay': 1.0, 'min': 0.05},
+            'source_harmonic': {'delay': 1.5, 'min': 0.05},
+            'span': {'delay': 0.4, 'min': 0.0},
+            'span_harmonic': {'delay': 0.3, 'min': 0.0},
+            'marker': {'delay': 0.4, 'min': 0.0, 'timeout': 2.0},
+            'marker_first': {'delay': 2.4, 'repeat': 1.0, 'min': 0.2, 'timeout': 6.0},
+            'marker_harmonic': {'delay': 0.3, 'min': 0.0, 'timeout': 2.0},
+            'supply': {'delay': 5.0, 'min': 0.0},
+        },
+    }
+
+    def __init__(self, params=None, name='settle', phase=None):
+        # name, phase -- trace track and sweep phase of the waits
+        self._name = name
+        self._phase = phase
+        params = params or dict()
+        self._params = {
+            **self.defaults,
+            **params,
+            'steps': {
+                k: {**v, **params.get('steps', dict()).get(k, dict())}
+                for k, v in self.defaults['steps'].items()
+            },
+        }
+        self._opc_supported = dict()
+        self._swe_time_supported = dict()
+
+    @property
+    def adaptive(self):
+        return self._params['adaptive']
+
+    def dwell(self, step, inst=None):
+        conf = self._params['steps'][step]
+        if inst is not None:
+            _flush(inst)
+        if not self.adaptive:
+            self._sleep(conf['delay'], step)
+            return
+        if inst is not None:
+            self._sync(inst)
+        self._sleep(conf['min'], step)
+
+    def read_peak(self, sa, step, fetch=None, reject=None):
+        # fetch -- alternative peak reader returning (freq, pow), marker peak search if not given
+        # reject -- predicate on the first reading, a rejected reading is returned at once instead of being waited on to settle
+        conf = self._params['steps'][step]
+
+        if not self.adaptive:
+            if fetch is not None:
+                self._sleep(conf['delay'], step)
+                reading = fetch()
+                if reject is not None:
+                    reject(reading)
+                return reading
+            sa.send('CALC:MARK1:MAX')
+            _flush(sa)
+            self._sleep(conf['delay'], step)
+            if 'repeat' in conf:
+                sa.send('CALC:MARK1:MAX')
+                _flush(sa)
+                self._sleep(conf['repeat'], step)
+            reading = self._fetch_marker(sa)
+            if reject is not None:
+                reject(reading)
+            return reading
+
+        self._sleep(conf['min'], step)
+        deadline = time.monotonic() + conf['timeout'] * self._params['time_scale']
+        # *OPC? does not start a new sweep in continuous mode, polls closer than a sweep could read the same trace
+        poll = max(self._params['poll'], self._sweep_time(sa))
+        last = None
+        stable = 0
+        while True:
+            # the sweep completes first, then the peak is taken from it
+            self._sync(sa)
+            if fetch is not None:
+                reading = fetch()
+            else:
+                sa.send('CALC:MARK1:MAX')
+                reading = self._fetch_marker(sa)
+
+            if last is None and reject is not None and reject(reading):
+                return reading
+            if last is not None and self._is_close(reading, last):
+                stable += 1
+            else:
+                stable = 0
+
+            if stable >= self._params['readings'] - 1:
+                return reading
+            if time.monotonic() >= deadline:
+                print(f'settle timeout on {step}, using last reading {reading}')
+                return reading
+
+            last = reading
+            self._sleep(poll, step)
+
+    def _fetch_marker(self, sa):
+        freq = float(sa.query(':CALC:MARK1:X?'))
+        pow_ = float(sa.query(':CALC:MARK1:Y?'))
+        return freq, pow_
+
+    def _sweep_time(self, sa):
+        if not self._swe_time_supported.get(id(sa), True):
+            return 0.0
+        try:
+            return float(sa.query(':SENS:SWE:TIME?'))
+        except Exception as ex:
+            print(f':SENS:SWE:TIME? not available on {sa}, polling at the fixed interval:', ex)
+            self._swe_time_supported[id(sa)] = False
+            return 0.0
+
+    def _is_close(self, reading, last):
+        f, p = reading
+        f_last, p_last = last
+        return abs(f - f_last) <= self._params['f_tol'] and abs(p - p_last) <= self._params['p_tol']
+
+    def _sync(self, inst):
+        if not self._params['use_opc'] or not self._opc_supported.get(id(inst), True):
+            _flush(inst)
+            self._sleep(self._params['poll'], 'sync')
+            return
+        try:
+            inst.query('*OPC?')
+        except Exception as ex:
+            print(f'*OPC? not available on {inst}, falling back to polling:', ex)
+            self._opc_supported[id(inst)] = False
+            self._sleep(self._params['poll'], 'sync')
+
+    def _sleep(self, delay, step):
+        if mock_enabled or not delay:
+            return
+        with account.measure('sleep'), trace.event(self._name, 'wait', step, self._phase):
+            time.sleep(delay * self._params['time_scale'])
+
+
+def _flush(inst):
+    # push out writes buffered by CachedInstrument before waiting on them
+    flush = getattr(inst, 'flush', None)
+    if flush is not None:
+        flush()
@@ -0,0 +1,374 @@
+import math
+import re
+import time
+
+import numpy as np
+
+from instr.instrumentfactory import InstrumentFactory
+
+GIGA = 1_000_000_000
+MEGA = 1_000_000
+KILO = 1_000
+MILLI = 1 / 1_000
+
+_number = re.compile(r'^[-+]?(\d+\.?\d*|\.\d+)([eE][-+]?\d+)?')
+
+
+class VcoModel:
+    # tuning curve, output power, harmonics and current draw of a VCO vs control and supply voltage
+
+    defaults = {
+        'f_min': 2.1 * GIGA,
+        'f_max': 3.05 * GIGA,
+        'u_knee': 6.0,            # V, tuning curve bend
+        'u_range': 10.0,          # V, control voltage at f_max
+        'pushing': 4.0 * MEGA,    # Hz/V of supply
+        'u_src_nom': 5.0,
+        'p_out': 8.0,             # dBm
+        'p_slope': 0.25,          # dB/V of control
+        'p_sag': 0.04,            # dB/V^2 around mid-range
+        'harmonics': {2: -22.0, 3: -35.0},   # dBc
+        'i_src': 25.0 * MILLI,    # A
+        'i_slope': 1.5 * MILLI,   # A/V of supply
+        'tau': 0.05,              # s, settling after a control voltage step
+        'tau_supply': 0.5,        # s, settling after a supply voltage step
+        'noise_f': 20 * KILO,     # Hz rms
+        'noise_p': 0.02,          # dB rms
+    }
+
+    def __init__(self, params=None):
+        self.params = {**self.defaults, **(params or dict())}
+
+    def freq(self, u_src, u_control):
+        p = self.params
+        shape = (1 - math.exp(-u_control / p['u_knee'])) / (1 - math.exp(-p['u_range'] / p['u_knee']))
+        return p['f_min'] + (p['f_max'] - p['f_min']) * shape + p['pushing'] * (u_src - p['u_src_nom'])
+
+    def power(self, u_src, u_control):
+        p = self.params
+        mid = p['u_range'] / 2
+        return p['p_out'] + p['p_slope'] * (u_control - mid) / mid - p['p_sag'] * (u_control - mid) ** 2 + \
+            0.3 * (u_src - p['u_src_nom'])
+
+    def harmonic(self, n, u_src, u_control):
+        return self.power(u_src, u_control) + self.params['harmonics'].get(n, -60.0) - 0.3 * u_control
+
+    def current(self, u_src, u_control):
+        p = self.params
+        return p['i_src'] + p['i_slope'] * (u_src - p['u_src_nom']) + 0.1 * MILLI * u_control
+
+
+class SimulatedBench:
+    # shared state of one simulated bench: the source drives the VCO, the analyzer looks at its output
+
+    defaults = {
+        'time_scale': 1.0,        # simulated waits are multiplied by this, the model clock runs 1 / time_scale faster
+        'bus_latency': 2 * MILLI,
+        'query_latency': 3 * MILLI,
+        'byte_time': 1 / 500_000,  # s per byte of a response, ~500 kB/s GPIB
+        'sweep_min': 10 * MILLI,
+        'sweep_k': 2.0,           # sweep time = k * span / rbw^2
+        'sweep_points': 1001,
+        'noise_floor': -80.0,
+        'seed': None,
+    }
+
+    def __init__(self, params=None, model=None):
+        self.params = {**self.defaults, **(params or dict())}
+        self.model = model or VcoModel()
+        self.rng = np.random.default_rng(self.params['seed'])
+
+        self.u_src = 0.0
+        self.u_control = 0.0
+        self.output = False
+
+        self._f_from = self._f_to = 0.0
+        self._p_from = self._p_to = -200.0
+        self._t_change = 0.0
+        self._tau = self.model.params['tau']
+
+    def now(self):
+        return time.monotonic() / self.params['time_scale']
+
+    def wait(self, seconds):
+        if seconds > 0:
+            time.sleep(seconds * self.params['time_scale'])
+
+    def set_source(self, u_src=None, u_control=None, output=None):
+        f_now, p_now = self.vco()
+        if u_src is not None and u_src != self.u_src:
+            self._tau = self.model.params['tau_supply']
+            self.u_src = u_src
+        elif u_control is not None and u_control != self.u_control:
+            self._tau = self.model.params['tau']
+        if u_control is not None:
+            self.u_control = u_control
+        if output is not None:
+            self.output = output
+
+        self._f_from, self._p_from = f_now, p_now
+        if self.output:
+            self._f_to = self.model.freq(self.u_src, self.u_control)
+            self._p_to = self.model.power(self.u_src, self.u_control)
+        else:
+            self._f_to, self._p_to = f_now, -200.0
+        self._t_change = self.now()
+
+    def vco(self):
+        # exponential settling from the previous operating point
+        k = math.exp(-(self.now() - self._t_change) / self._tau) if self._tau else 0.0
+        return self._f_to + (self._f_from - self._f_to) * k, self._p_to + (self._p_from - self._p_to) * k
+
+    def current(self):
+        return self.model.current(self.u_src, self.u_control) if self.output else 0.0
+
+
+class _SimulatedInstrument:
+    label = ''
+    idn = ''
+
+    def __init__(self, addr, bench, verbose=False):
+        self._addr = addr
+        self._bench = bench
+        self._verbose = verbose
+        self._name = self.idn.split(',')[1]
+        # SCPI error queue, read with SYST:ERR?
+        self._errors = list()
+
+    def __str__(self):
+        return f'{self._name}'
+
+    @property
+    def time_scale(self):
+        return self._bench.params['time_scale']
+
+    @property
+    def status(self):
+        return f'{self._name} at {self._addr}'
+
+    def send(self, command):
+        self._bench.wait(self._bench.params['bus_latency'])
+        for cmd in _split(command):
+            self._handle(cmd)
+        if self._verbose:
+            print(f'{self._name}: {command}')
+
+    def query(self, question):
+        self._bench.wait(self._bench.params['query_latency'])
+        answer = ''
+        for cmd in _split(question):
+            answer = self._handle(cmd)
+        answer = str(answer)
+        self._bench.wait(len(answer) * self._bench.params['byte_time'])
+        if self._verbose:
+            print(f'{self._name}: {question} {answer}')
+        return answer
+
+    def _handle(self, cmd):
+        header, _, args = cmd.partition(' ')
+        header = header.upper().lstrip(':')
+        if header == '*IDN?':
+            return self.idn
+        if header == '*OPC?':
+            self._wait_complete()
+            return '1'
+        if header == '*RST':
+            self._reset()
+            return ''
+        if header == '*CLS':
+            self._errors.clear()
+            return ''
+        if header in ('SYST:ERR?', 'SYST:ERR:NEXT?'):
+            return self._errors.pop(0) if self._errors else '+0,"No error"'
+        return self._command(header, args.strip())
+
+    def _wait_complete(self):
+        pass
+
+    def _reset(self):
+        pass
+
+    def _command(self, header, args):
+        # headers the instrument does not know, subclasses hand over the ones they do not handle
+        self._errors.append(f'-113,"Undefined header;{header}"')
+        if self._verbose:
+            print(f'{self._name}: undefined header {header}')
+        return ''
+
+
+class SimulatedSource(_SimulatedInstrument):
+    idn = 'Keysight Technologies,E3648A sim,0,1.0'
+
+    def _reset(self):
+        self._bench.set_source(u_src=0.0, u_control=0.0, output=False)
+
+    def _command(self, header, args):
+        if header in ('APPLY', 'APPL'):
+            channel, voltage, *_ = [a.strip() for a in args.split(',')]
+            if channel.upper() == 'P6V':
+                self._bench.set_source(u_src=_value(voltage))
+            else:
+                self._bench.set_source(u_control=_value(voltage))
+        elif header in ('OUTP', 'OUTPUT'):
+            self._bench.set_source(output=args.upper() in ('ON', '1'))
+        elif header.startswith('MEAS:CURR'):
+            return f'{self._bench.current() * (1 + 1e-4 * self._bench.rng.standard_normal()):.8e}'
+        else:
+            return super()._command(header, args)
+        return ''
+
+
+class SimulatedAnalyzer(_SimulatedInstrument):
+    idn = 'Keysight Technologies,N9030A sim,0,1.0'
+
+    def __init__(self, addr, bench, verbose=False):
+        super().__init__(addr, bench, verbose)
+        self._reset()
+
+    def _reset(self):
+        self._start = 10 * MEGA
+        self._stop = 26.5 * GIGA
+        self._x_off = 0.0
+        self._y_off = 0.0
+        self._binary = False
+        self._marker = (0.0, -200.0)
+        self._t_setup = self._bench.now()
+
+    @property
+    def rbw(self):
+        # auto-coupled RBW, span / 106 rounded to the 1-3 sequence
+        span = self._stop - self._start
+        target = min(max(span / 106, 1 * KILO), 3 * MEGA)
+        return max(v for v in [10 ** e * m for e in range(3, 7) for m in (1, 3)] if v <= target)
+
+    @property
+    def sweep_time(self):
+        p = self._bench.params
+        return max(p['sweep_min'], p['sweep_k'] * (self._stop - self._start) / self.rbw ** 2)
+
+    def _retune(self):
+        self._t_setup = self._bench.now()
+
+    def _wait_complete(self):
+        # wait for the end of the sweep in progress
+        elapsed = self._bench.now() - self._t_setup
+        t = self.sweep_time
+        self._bench.wait(t * math.ceil(max(elapsed, 1e-9) / t) - elapsed)
+
+    def _command(self, header, args):
+        value = _value(args) if _number.match(args) else None
+
+        if header == 'SENS:FREQ:STAR':
+            self._start = value
+            self._retune()
+        elif header == 'SENS:FREQ:STOP':
+            self._stop = value
+            self._retune()
+        elif header == 'SENS:FREQ:CENT':
+            span = self._stop - self._start
+            self._start, self._stop = value - span / 2, value + span / 2
+            self._retune()
+        elif header == 'SENS:FREQ:SPAN':
+            center = (self._stop + self._start) / 2
+            self._start, self._stop = center - value / 2, center + value / 2
+            self._retune()
+        elif header == 'DISP:WIND:TRAC:X:OFFS':
+            self._x_off = value
+        elif header == 'DISP:WIND:TRAC:Y:RLEV:OFFS':
+            self._y_off = value
+        elif header == 'FORM:DATA':
+            self._binary = args.upper().startswith('REAL')
+        elif header in ('DISP:WIND:TRAC:Y:RLEV', 'CAL:AUTO', 'CALC:MARK1:MODE'):
+            # accepted, no effect on the simulated trace
+            pass
+        elif header == 'CALC:MARK1:MAX':
+            self._bench.wait(self._bench.params['bus_latency'])
+            trace = self._trace()
+            i = int(np.argmax(trace))
+            self._marker = (self._x_off + self._start + i * (self._stop - self._start) / (len(trace) - 1), float(trace[i]))
+        elif header == 'CALC:MARK1:X?':
+            return f'{self._marker[0]:.10e}'
+        elif header == 'CALC:MARK1:Y?':
+            return f'{self._marker[1]:.3f}'
+        elif header == 'SENS:SWE:TIME?':
+            return f'{self.sweep_time:.6e}'
+        elif header == 'SENS:SWE:POIN?':
+            return str(self._bench.params['sweep_points'])
+        elif header == 'TRAC:DATA?':
+            trace = self._trace()
+            self._bench.wait(len(trace) * (4 if self._binary else 12) * self._bench.params['byte_time'])
+            return ','.join(f'{v:.3f}' for v in trace)
+        else:
+            return super()._command(header, args)
+        return ''
+
+    def query_binary_values(self, message, datatype='f', is_big_endian=False, container=list):
+        self._bench.wait(self._bench.params['query_latency'])
+        for cmd in _split(message)[:-1]:
+            self._handle(cmd)
+        trace = self._trace().astype(np.float32)
+        self._bench.wait(trace.nbytes * self._bench.params['byte_time'])
+        return container(trace)
+
+    def _trace(self):
+        # spectrum of the settled part of the last sweep: fundamental and harmonics over the noise floor
+        bench = self._bench
+        n = bench.params['sweep_points']
+        freqs = np.linspace(self._start, self._stop, n)
+        trace = bench.params['noise_floor'] + bench.rng.normal(0.0, 1.0, n)
+
+        f, p = bench.vco()
+        model = bench.model
+        if p > -150:
+            f += bench.rng.normal(0.0, model.params['noise_f'])
+            p += bench.rng.normal(0.0, model.params['noise_p'])
+            half_rbw = self.rbw / 2
+            for k in (1, 2, 3):
+                level = p if k == 1 else p + model.harmonic(k, bench.u_src, bench.u_control) - model.power(bench.u_src, bench.u_control)
+                tone = level - 3.0 * ((freqs - k * f) / half_rbw) ** 2
+                np.maximum(trace, tone, out=trace)
+
+        return trace + self._y_off
+
+
+class SimulatedAnalyzerFactory(InstrumentFactory):
+    def __init__(self, addr):
+        super().__init__(addr=addr, label='Анализатор')
+
+    def from_address(self):
+        return SimulatedAnalyzer(self.addr, bench_for(self.addr))
+
+
+class SimulatedSourceFactory(InstrumentFactory):
+    def __init__(self, addr):
+        super().__init__(addr=addr, label='Источник питания')
+
+    def from_address(self):
+        return SimulatedSource(self.addr, bench_for(self.addr))
+
+
+_benches = dict()
+
+
+def is_simulated(addr):
+    return addr.upper().startswith('SIM')
+
+
+def bench_for(addr, params=None, model=None):
+    # SIM::<bench>::<instrument> addresses with the same <bench> share one simulated VCO
+    parts = addr.split('::')
+    key = parts[1] if len(parts) > 2 else 'default'
+    if key not in _benches or params is not None or model is not None:
+        _benches[key] = SimulatedBench(params=params, model=model)
+    return _benches[key]
+
+
+def _split(message):
+    return [m.strip() for m in message.split(';') if m.strip()]
+
+
+def _value(arg):
+    match = _number.match(arg.strip())
+    if not match:
+        raise ValueError(f'bad numeric argument: {arg}')
+    return float(match.group(0))
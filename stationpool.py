@@ -0,0 +1,105 @@
+from concurrent.futures import ThreadPoolExecutor
+
+from PyQt5.QtCore import QObject, pyqtSignal
+from forgot_again.file import load_ast_if_exists
+from mytools.measurewidget import CancelToken
+
+from instrumentcontroller import InstrumentController
+
+
+class StationPool(QObject):
+    # drives several independent benches from one process, one worker thread per station
+    stationConnected = pyqtSignal(str, bool)
+    stationProgress = pyqtSignal(str, int, int)
+    stationFinished = pyqtSignal(str, bool)
+
+    def __init__(self, parent=None, config='stations.ini'):
+        super().__init__(parent=parent)
+
+        self._config = load_ast_if_exists(config, default={})
+
+        self.stations = {
+            name: InstrumentController(
+                parent=self,
+                addrs={k: conf[k] for k in ['Анализатор', 'Источник']},
+                name=name
+            ) for name, conf in self._config.items()
+        }
+        for name, controller in self.stations.items():
+            controller.feed.pointsReady.connect(lambda batch, name=name: self._on_points_ready(name, batch))
+
+        self._tokens = dict()
+        self._running = set()
+        self._executor = None
+
+    def __bool__(self):
+        return bool(self.stations)
+
+    def device(self, name):
+        return self._config[name]['device']
+
+    def addrs(self, name):
+        controller = self.stations[name]
+        return {k: v.addr for k, v in controller.requiredInstruments.items()}
+
+    @property
+    def busy(self):
+        return bool(self._running)
+
+    def connect_all(self):
+        self._start()
+        for name in self.stations:
+            self._executor.submit(self._connect, name)
+
+    def measure_all(self, secondary):
+        # every station runs with the same measurement params, devices and addresses come from the station config
+        self._start()
+        for name, controller in self.stations.items():
+            if name in self._running:
+                continue
+            controller.secondaryParams.params = dict(secondary.params)
+            self._tokens[name] = CancelToken()
+            self._running.add(name)
+            self._executor.submit(self._measure, name, self._tokens[name])
+
+    def cancel_all(self):
+        for token in self._tokens.values():
+            token.cancelled = True
+
+    def shutdown(self):
+        self.cancel_all()
+        if self._executor is not None:
+            self._executor.shutdown(wait=True)
+            self._executor = None
+
+    def _start(self):
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(max_workers=max(len(self.stations), 1), thread_name_prefix='station')
+
+    def _connect(self, name):
+        controller = self.stations[name]
+        try:
+            controller.connect(self.addrs(name))
+        except Exception as ex:
+            print(f'{name}: connection error:', ex)
+        self.stationConnected.emit(name, controller.found)
+
+    def _measure(self, name, token):
+        controller = self.stations[name]
+        ok = False
+        try:
+            if not controller.found:
+                raise RuntimeError('instruments not found')
+            device = self.device(name)
+            controller.check(token, [device, None])
+            ok = controller.measure(token, [device, None]) and not token.cancelled
+            if ok:
+                controller.result._process()
+                controller.result.export_excel(open_explorer=False)
+        except Exception as ex:
+            print(f'{name}: measure error:', ex)
+        self._running.discard(name)
+        self.stationFinished.emit(name, ok)
+
+    def _on_points_ready(self, name, batch):
+        self.stationProgress.emit(name, batch[-1].done, batch[-1].total)
@@ -0,0 +1,101 @@
+from PyQt5.QtCore import pyqtSlot
+from PyQt5.QtWidgets import QWidget, QGridLayout, QTableWidget, QTableWidgetItem, QProgressBar, QPushButton, \
+    QHBoxLayout, QLabel, QHeaderView
+
+
+class StationsWidget(QWidget):
+    headers = ['Стенд', 'Изделие', 'Анализатор', 'Источник', 'Состояние', 'Прогресс']
+
+    def __init__(self, parent=None, pool=None, controller=None):
+        super().__init__(parent)
+
+        self._pool = pool
+        self._controller = controller   # source of the shared measurement params
+        self._progress = dict()
+
+        self._grid = QGridLayout()
+
+        self._table = QTableWidget(len(self._pool.stations), len(self.headers))
+        self._table.setHorizontalHeaderLabels(self.headers)
+        self._table.horizontalHeader().setSectionResizeMode(QHeaderView.Stretch)
+        self._table.verticalHeader().hide()
+
+        self._rows = dict()
+        self._bars = dict()
+        for row, name in enumerate(self._pool.stations):
+            addrs = self._pool.addrs(name)
+            for col, text in enumerate([name, self._pool.device(name), addrs['Анализатор'], addrs['Источник'], 'не подключен']):
+                self._table.setItem(row, col, QTableWidgetItem(text))
+            bar = QProgressBar()
+            bar.setValue(0)
+            self._table.setCellWidget(row, 5, bar)
+            self._rows[name] = row
+            self._bars[name] = bar
+
+        self._totalBar = QProgressBar()
+        self._totalBar.setValue(0)
+
+        self._btnConnect = QPushButton('Подключить')
+        self._btnMeasure = QPushButton('Измерить все')
+        self._btnCancel = QPushButton('Отмена')
+
+        buttons = QHBoxLayout()
+        buttons.addWidget(QLabel('Всего:'))
+        buttons.addWidget(self._totalBar, 1)
+        buttons.addWidget(self._btnConnect)
+        buttons.addWidget(self._btnMeasure)
+        buttons.addWidget(self._btnCancel)
+
+        self._grid.addWidget(self._table, 0, 0)
+        self._grid.addLayout(buttons, 1, 0)
+        self.setLayout(self._grid)
+
+        self._btnConnect.clicked.connect(self.on_btnConnect_clicked)
+        self._btnMeasure.clicked.connect(self.on_btnMeasure_clicked)
+        self._btnCancel.clicked.connect(self._pool.cancel_all)
+
+        self._pool.stationConnected.connect(self.on_station_connected)
+        self._pool.stationProgress.connect(self.on_station_progress)
+        self._pool.stationFinished.connect(self.on_station_finished)
+
+    def _set_status(self, name, text):
+        self._table.item(self._rows[name], 4).setText(text)
+
+    def _update_total(self):
+        done = sum(d for d, _ in self._progress.values())
+        total = sum(t for _, t in self._progress.values())
+        self._totalBar.setValue(int(100 * done / total) if total else 0)
+
+    @pyqtSlot()
+    def on_btnConnect_clicked(self):
+        for name in self._pool.stations:
+            self._set_status(name, 'поиск...')
+        self._pool.connect_all()
+
+    @pyqtSlot()
+    def on_btnMeasure_clicked(self):
+        self._progress.clear()
+        for name in self._pool.stations:
+            self._bars[name].setValue(0)
+            self._set_status(name, 'измерение...')
+        self._totalBar.setValue(0)
+        self._pool.measure_all(self._controller.secondaryParams)
+
+    @pyqtSlot(str, bool)
+    def on_station_connected(self, name, found):
+        self._set_status(name, 'подключен' if found else 'приборы не найдены')
+
+    @pyqtSlot(str, int, int)
+    def on_station_progress(self, name, done, total):
+        self._progress[name] = (done, total)
+        self._bars[name].setValue(int(100 * done / total) if total else 0)
+        self._update_total()
+
+    @pyqtSlot(str, bool)
+    def on_station_finished(self, name, ok):
+        if ok:
+            done, total = self._progress.get(name, (1, 1))
+            self._progress[name] = (total, total)
+            self._bars[name].setValue(100)
+        self._set_status(name, 'готово' if ok else 'ошибка / отмена')
+        self._update_total()
@@ -0,0 +1,192 @@
+import json
+import threading
+import time
+
+from collections import defaultdict, deque
+from contextlib import contextmanager
+
+import numpy as np
+
+from tracepeak import find_binary_resource
+
+
+class TimeAccount:
+    # wall time per category (sleep, io, storage, processing, export, plot),
+    # summed over threads, so overlapping instrument I/O can add up to more than the wall time
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._totals = defaultdict(float)
+        self._counts = defaultdict(int)
+
+    def add(self, category, seconds):
+        with self._lock:
+            self._totals[category] += seconds
+            self._counts[category] += 1
+
+    @contextmanager
+    def measure(self, category):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.add(category, time.perf_counter() - start)
+
+    def reset(self):
+        with self._lock:
+            self._totals.clear()
+            self._counts.clear()
+
+    def totals(self):
+        with self._lock:
+            return dict(self._totals)
+
+    def counts(self):
+        with self._lock:
+            return dict(self._counts)
+
+
+account = TimeAccount()
+
+
+class CommandTrace:
+    # bounded log of (start, end, instrument, kind, command, phase) events,
+    # kind is send, query or wait, times are perf_counter seconds
+
+    maxlen = 100_000
+
+    def __init__(self, maxlen=None):
+        self._lock = threading.Lock()
+        self._events = deque(maxlen=maxlen or self.maxlen)
+
+    def __len__(self):
+        return len(self._events)
+
+    @contextmanager
+    def event(self, instrument, kind, command, phase=None):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            end = time.perf_counter()
+            with self._lock:
+                self._events.append((start, end, instrument, kind, command, phase.name if phase else ''))
+
+    def clear(self):
+        with self._lock:
+            self._events.clear()
+
+    def events(self):
+        with self._lock:
+            return list(self._events)
+
+    def export_chrome(self, file_name):
+        # Chrome trace / Perfetto JSON, one track per instrument
+        events = self.events()
+        t0 = events[0][0] if events else 0.0
+        tids = dict()
+        trace_events = list()
+        for start, end, instrument, kind, command, phase in events:
+            tid = tids.setdefault(instrument, len(tids) + 1)
+            trace_events.append({
+                'name': command,
+                'cat': kind,
+                'ph': 'X',
+                'ts': (start - t0) * 1e6,
+                'dur': (end - start) * 1e6,
+                'pid': 1,
+                'tid': tid,
+                'args': {'phase': phase},
+            })
+        trace_events += [
+            {'name': 'thread_name', 'ph': 'M', 'pid': 1, 'tid': tid, 'args': {'name': instrument}}
+            for instrument, tid in tids.items()
+        ]
+        with open(file_name, mode='wt', encoding='utf-8') as f:
+            json.dump({'traceEvents': trace_events, 'displayTimeUnit': 'ms'}, f, ensure_ascii=False)
+
+    def summary(self, bins=20):
+        # per (instrument, command header) latency stats in seconds and a log-spaced histogram
+        groups = defaultdict(list)
+        for start, end, instrument, kind, command, _ in self.events():
+            groups[(instrument, _headers(command) if kind != 'wait' else command)].append(end - start)
+
+        rows = list()
+        for (instrument, command), durations in groups.items():
+            d = np.array(durations)
+            lo, hi = max(d.min(), 1e-6), max(d.max(), 1e-6)
+            edges = np.geomspace(lo, hi * 1.0001, bins + 1) if hi > lo else np.array([lo, lo * 1.0001])
+            counts, _ = np.histogram(np.clip(d, lo, None), bins=edges)
+            rows.append({
+                'instrument': instrument,
+                'command': command,
+                'count': len(d),
+                'total': float(d.sum()),
+                'mean': float(d.mean()),
+                'p50': float(np.percentile(d, 50)),
+                'p95': float(np.percentile(d, 95)),
+                'max': float(d.max()),
+                'edges': edges,
+                'counts': counts,
+            })
+        return sorted(rows, key=lambda r: -r['total'])
+
+
+trace = CommandTrace()
+
+
+class SweepPhase:
+    # current phase of one sweep (main, x2, x3), shared by its instruments and waits,
+    # commands run on the I/O worker threads are tagged with the phase the sweep is waiting in
+
+    def __init__(self, name=''):
+        self.name = name
+
+    @contextmanager
+    def __call__(self, name):
+        previous, self.name = self.name, name
+        try:
+            yield
+        finally:
+            self.name = previous
+
+
+class TimedInstrument:
+    # counts the time spent in send/query of the wrapped instrument as bus I/O
+    # and logs every message to the command trace under the given name
+
+    def __init__(self, inst, name='', phase=None, category='io'):
+        self._inst = inst
+        self._name = name or str(inst)
+        self._phase = phase
+        self._category = category
+
+        # binary trace reads are found by TracePeakReader through the ._inst chain
+        resource = find_binary_resource(inst)
+        if resource is not None:
+            self.query_binary_values = self._timed(resource.query_binary_values)
+
+    def __getattr__(self, item):
+        return getattr(self._inst, item)
+
+    def __str__(self):
+        return f'{self._inst}'
+
+    def send(self, command):
+        with account.measure(self._category), trace.event(self._name, 'send', command, self._phase):
+            return self._inst.send(command)
+
+    def query(self, question):
+        with account.measure(self._category), trace.event(self._name, 'query', question, self._phase):
+            return self._inst.query(question)
+
+    def _timed(self, fn):
+        def wrapper(message, *args, **kwargs):
+            with account.measure(self._category), trace.event(self._name, 'query', message, self._phase):
+                return fn(message, *args, **kwargs)
+        return wrapper
+
+
+def _headers(message):
+    # 'SENS:FREQ:CENT 2e9Hz;:CALC:MARK1:MAX' -> 'SENS:FREQ:CENT;CALC:MARK1:MAX'
+    return ';'.join(m.strip().split(' ')[0].lstrip(':').upper() for m in message.split(';') if m.strip())
@@ -0,0 +1,115 @@
+import numpy as np
+import pyqtgraph as pg
+
+from PyQt5.QtCore import pyqtSlot
+from PyQt5.QtWidgets import QWidget, QGridLayout, QTableWidget, QTableWidgetItem, QPushButton, QHBoxLayout, \
+    QHeaderView, QFileDialog, QLabel, QAbstractItemView
+
+from timing import trace
+
+
+class TimingWidget(QWidget):
+    headers = ['Прибор', 'Команда', 'N', 'Сумма, с', 'Ср., мс', 'p50, мс', 'p95, мс', 'Макс., мс']
+
+    def __init__(self, parent=None):
+        super().__init__(parent)
+
+        self._rows = list()
+
+        self._grid = QGridLayout()
+
+        self._table = QTableWidget(0, len(self.headers))
+        self._table.setHorizontalHeaderLabels(self.headers)
+        self._table.horizontalHeader().setSectionResizeMode(QHeaderView.ResizeToContents)
+        self._table.horizontalHeader().setSectionResizeMode(1, QHeaderView.Stretch)
+        self._table.verticalHeader().hide()
+        self._table.setSelectionBehavior(QAbstractItemView.SelectRows)
+        self._table.setSelectionMode(QAbstractItemView.SingleSelection)
+        self._table.setEditTriggers(QAbstractItemView.NoEditTriggers)
+
+        self._plot = pg.PlotWidget()
+        self._plot.setLabel('bottom', 'Длительность, мс')
+        self._plot.setLabel('left', 'Количество')
+        self._plot.setLogMode(x=True, y=False)
+        self._plot.showGrid(x=True, y=True)
+        self._bars = None
+
+        self._lblTotal = QLabel()
+        self._btnRefresh = QPushButton('Обновить')
+        self._btnClear = QPushButton('Очистить')
+        self._btnExport = QPushButton('Экспорт трассы...')
+
+        buttons = QHBoxLayout()
+        buttons.addWidget(self._lblTotal, 1)
+        buttons.addWidget(self._btnRefresh)
+        buttons.addWidget(self._btnClear)
+        buttons.addWidget(self._btnExport)
+
+        self._grid.addWidget(self._table, 0, 0)
+        self._grid.addWidget(self._plot, 0, 1)
+        self._grid.addLayout(buttons, 1, 0, 1, 2)
+        self._grid.setColumnStretch(0, 3)
+        self._grid.setColumnStretch(1, 2)
+        self.setLayout(self._grid)
+
+        self._btnRefresh.clicked.connect(self.refresh)
+        self._btnClear.clicked.connect(self.on_btnClear_clicked)
+        self._btnExport.clicked.connect(self.on_btnExport_clicked)
+        self._table.itemSelectionChanged.connect(self.on_selection_changed)
+
+    @pyqtSlot()
+    def refresh(self):
+        self._rows = trace.summary()
+        self._table.setRowCount(len(self._rows))
+        for row, r in enumerate(self._rows):
+            values = [
+                r['instrument'],
+                r['command'],
+                str(r['count']),
+                f'{r["total"]:.3f}',
+                f'{r["mean"] * 1e3:.2f}',
+                f'{r["p50"] * 1e3:.2f}',
+                f'{r["p95"] * 1e3:.2f}',
+                f'{r["max"] * 1e3:.2f}',
+            ]
+            for col, text in enumerate(values):
+                self._table.setItem(row, col, QTableWidgetItem(text))
+        self._lblTotal.setText(f'Событий: {len(trace)}, всего {sum(r["total"] for r in self._rows):.2f} с')
+        if self._rows:
+            self._table.selectRow(0)
+        else:
+            self._show_histogram(None)
+
+    def clear(self):
+        trace.clear()
+        self.refresh()
+
+    def _show_histogram(self, row):
+        if self._bars is not None:
+            self._plot.removeItem(self._bars)
+            self._bars = None
+        if row is None:
+            return
+
+        # log-spaced bins, drawn on the log10 x axis of the plot
+        edges = np.log10(row['edges'] * 1e3)
+        self._bars = pg.BarGraphItem(x0=edges[:-1], x1=edges[1:], height=row['counts'], brush='#1f77b4')
+        self._plot.addItem(self._bars)
+        self._plot.setTitle(f'{row["instrument"]}: {row["command"]}')
+
+    @pyqtSlot()
+    def on_selection_changed(self):
+        selected = self._table.selectionModel().selectedRows()
+        self._show_histogram(self._rows[selected[0].row()] if selected else None)
+
+    @pyqtSlot()
+    def on_btnClear_clicked(self):
+        self.clear()
+
+    @pyqtSlot()
+    def on_btnExport_clicked(self):
+        file_name, _ = QFileDialog.getSaveFileName(self, 'Экспорт трассы', 'trace.json', 'Chrome trace (*.json)')
+        if not file_name:
+            return
+        trace.export_chrome(file_name)
+        print(f'trace exported to {file_name}')
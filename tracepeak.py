@@ -0,0 +1,88 @@
+import numpy as np
+
+
+class TracePeakReader:
+    # reads the whole sweep trace in one transfer and finds the peak on the host side
+
+    def __init__(self, sa, binary=True, sink=None):
+        self._sa = sa
+        self._binary = binary
+        self._format_set = False
+        # sink(trace, f_start, f_stop) gets every trace read, the reader does not touch the array afterwards
+        self._sink = sink
+
+        self.last_trace = None
+
+    def read(self, f_start, f_stop):
+        # f_start, f_stop -- displayed span, including any X axis offset
+        trace = self.fetch()
+        if self._sink is not None:
+            self._sink(trace, f_start, f_stop)
+        return find_peak(trace, f_start, f_stop)
+
+    def fetch(self):
+        if not self._format_set:
+            self._sa.send(':FORM:DATA REAL,32' if self._binary else ':FORM:DATA ASC')
+            self._format_set = True
+
+        trace = None
+        if self._binary:
+            trace = self._fetch_binary()
+        if trace is None:
+            trace = np.array(self._sa.query(':TRAC:DATA? TRACE1').split(','), dtype=float)
+
+        self.last_trace = trace
+        return trace
+
+    def restore(self):
+        if self._format_set:
+            self._sa.send(':FORM:DATA ASC')
+            self._format_set = False
+
+    def _fetch_binary(self):
+        flush = getattr(self._sa, 'flush', None)
+        if flush is not None:
+            flush()
+
+        resource = find_binary_resource(self._sa)
+        if resource is None:
+            print('binary trace transfer not available, falling back to ASCII')
+            self._binary = False
+            self._sa.send(':FORM:DATA ASC')
+            return None
+
+        return resource.query_binary_values(
+            ':TRAC:DATA? TRACE1',
+            datatype='f',
+            is_big_endian=True,
+            container=np.array
+        )
+
+
+def find_peak(trace, f_start, f_stop):
+    n = len(trace)
+    i = int(np.argmax(trace))
+    df = (f_stop - f_start) / (n - 1) if n > 1 else 0.0
+
+    shift = 0.0
+    peak = float(trace[i])
+    if 0 < i < n - 1:
+        # parabolic fit through the peak bin and its neighbours
+        a, b, c = (float(v) for v in trace[i - 1:i + 2])
+        denom = a - 2 * b + c
+        if denom:
+            shift = 0.5 * (a - c) / denom
+            peak = b - 0.25 * (a - c) * shift
+
+    return f_start + (i + shift) * df, peak
+
+
+def find_binary_resource(inst):
+    # instrument wrappers keep the VISA resource in ._inst
+    seen = set()
+    while inst is not None and id(inst) not in seen:
+        seen.add(id(inst))
+        if hasattr(type(inst), 'query_binary_values') or 'query_binary_values' in getattr(inst, '__dict__', {}):
+            return inst
+        inst = getattr(inst, '__dict__', {}).get('_inst')
+    return None
@@ -0,0 +1,66 @@
+from bisect import insort
+
+
+class FrequencyTracker:
+    # predicts the next VCO frequency from the local tuning slope,
+    # so the analyzer can sweep a narrow span around it instead of the full band,
+    # the span follows the predicted frequency step, the further the extrapolation the larger its error
+
+    defaults = {
+        'enabled': False,
+        'span': 20_000_000.0,  # Hz, the narrowest span
+        'slope_span': 1.0,     # span per predicted frequency step, Hz/Hz
+        'edge': 0.1,           # peak closer to the span edge than this fraction is treated as lost
+        'p_drop': 6.0,         # dB below the previous point is treated as lost
+    }
+
+    def __init__(self, params=None):
+        self._params = {**self.defaults, **(params or dict())}
+        self._points = list()
+
+        self.hits = 0
+        self.misses = 0
+
+    @property
+    def enabled(self):
+        return self._params['enabled']
+
+    def reset(self):
+        self._points.clear()
+
+    def add(self, u_control, freq, pow_):
+        insort(self._points, (u_control, freq, pow_))
+
+    def predict(self, u_control, f_min, f_max):
+        # (center, span) of the narrow span, None when there is nothing to extrapolate from
+        if not self.enabled or len(self._points) < 2:
+            return None
+
+        # slope through the two measured points closest to u_control
+        (u1, f1, _), (u2, f2, _) = sorted(self._nearest(u_control, 2))
+        if u2 == u1:
+            return None
+        slope = (f2 - f1) / (u2 - u1)
+        f_pred = f2 + slope * (u_control - u2)
+        # the nearer measured point is the one the extrapolation starts from
+        step = min(abs(u_control - u1), abs(u_control - u2))
+        span = max(self._params['span'], self._params['slope_span'] * abs(slope) * step)
+        if span >= f_max - f_min:
+            return None
+        return min(max(f_pred, f_min + span / 2), f_max - span / 2), span
+
+    def found(self, u_control, freq, pow_, span):
+        f_start, f_stop = span
+        margin = (f_stop - f_start) * self._params['edge']
+        in_span = f_start + margin <= freq <= f_stop - margin
+        p_last = self._nearest(u_control, 1)[0][2] if self._points else None
+        level_ok = p_last is None or pow_ >= p_last - self._params['p_drop']
+
+        if in_span and level_ok:
+            self.hits += 1
+            return True
+        self.misses += 1
+        return False
+
+    def _nearest(self, u_control, count):
+        return sorted(self._points, key=lambda point: abs(point[0] - u_control))[:count]
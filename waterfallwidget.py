@@ -0,0 +1,117 @@
+import numpy as np
+import pyqtgraph as pg
+
+from PyQt5.QtCore import QRectF, QTimer, pyqtSlot
+from PyQt5.QtWidgets import QWidget, QGridLayout, QHBoxLayout, QLabel, QPushButton
+
+
+# viridis stops, built here: pyqtgraph 0.12 ships neither colormap.get('viridis') nor ImageItem.setColorMap
+_viridis = pg.ColorMap(
+    pos=np.linspace(0, 1, 5),
+    color=np.array([[68, 1, 84, 255], [59, 82, 139, 255], [33, 145, 140, 255], [94, 201, 98, 255], [253, 231, 37, 255]], dtype=np.ubyte),
+)
+
+
+class WaterfallWidget(QWidget):
+    # the last analyzer trace and a scrolling waterfall of the previous ones,
+    # fed from a TraceFeed and redrawn at most once a frame with a single image update,
+    # every trace is resampled to a fixed number of bins over its own span,
+    # so narrow tracking spans and full spans share the rows
+    label_style = {'color': 'k', 'font-size': '15px'}
+
+    def __init__(self, parent=None, feed=None, depth=256, bins=512, fps=30):
+        super().__init__(parent)
+
+        self._feed = feed
+
+        # ring of resampled traces, row self._head is the next one to write
+        self._ring = np.full((depth, bins), np.nan, dtype=np.float32)
+        self._head = 0
+        self._count = 0
+        self._bins = np.linspace(0, 1, bins)
+
+        self._grid = QGridLayout()
+
+        self._win = pg.GraphicsLayoutWidget(show=True)
+        self._win.setBackground('w')
+
+        self._plot_trace = self._win.addPlot(row=0, col=0)
+        self._plot_trace.setLabel('left', 'P, дБм', **self.label_style)
+        self._plot_trace.setLabel('bottom', 'F, МГц', **self.label_style)
+        self._plot_trace.showGrid(x=True, y=True)
+        self._curve = self._plot_trace.plot(pen=pg.mkPen(color='#1f77b4', width=1))
+
+        self._plot_waterfall = self._win.addPlot(row=1, col=0)
+        self._plot_waterfall.setLabel('left', 'Развёртка', **self.label_style)
+        self._plot_waterfall.setLabel('bottom', 'Полоса обзора, %', **self.label_style)
+        self._image = pg.ImageItem()
+        self._image.setLookupTable(_viridis.getLookupTable(0.0, 1.0, 256))
+        self._plot_waterfall.addItem(self._image)
+        self._win.ci.layout.setRowStretchFactor(1, 2)
+
+        self._lblStatus = QLabel()
+        self._btnClear = QPushButton('Очистить')
+
+        buttons = QHBoxLayout()
+        buttons.addWidget(self._lblStatus, 1)
+        buttons.addWidget(self._btnClear)
+
+        self._grid.addWidget(self._win, 0, 0)
+        self._grid.addLayout(buttons, 1, 0)
+        self.setLayout(self._grid)
+
+        self._btnClear.clicked.connect(self.on_btnClear_clicked)
+
+        self._timer = QTimer(self)
+        self._timer.setInterval(int(1000 / fps))
+        self._timer.timeout.connect(self.refresh)
+        self._timer.start()
+
+    @pyqtSlot()
+    def refresh(self):
+        batch = self._feed.take() if self._feed is not None else []
+        if not batch:
+            return
+
+        depth = len(self._ring)
+        for trace, f_start, f_stop in batch[-depth:]:
+            n = len(trace)
+            if not n:
+                continue
+            self._ring[self._head] = _resample(trace, self._bins)
+            self._head = (self._head + 1) % depth
+            self._count = min(self._count + 1, depth)
+
+        trace, f_start, f_stop = batch[-1]
+        self._curve.setData(np.linspace(f_start, f_stop, len(trace)) / 1_000_000, trace)
+
+        # oldest row at the bottom, newest at the top, column-major image: x -- bins, y -- rows
+        rows = np.roll(self._ring, -self._head, axis=0)
+        filled = rows[depth - self._count:]
+        self._image.setImage(rows.T, autoLevels=False, levels=(float(np.nanmin(filled)), float(np.nanmax(filled))))
+        self._image.setRect(QRectF(0, 0, 100, depth))
+
+        self._lblStatus.setText(f'Развёрток: {self._count}, пропущено: {self._feed.dropped}')
+
+    def clear(self):
+        if self._feed is not None:
+            self._feed.clear()
+        self._ring[:] = np.nan
+        self._head = 0
+        self._count = 0
+        self._curve.setData([], [])
+        self._image.clear()
+        self._lblStatus.setText('')
+
+    @pyqtSlot()
+    def on_btnClear_clicked(self):
+        self.clear()
+
+
+def _resample(trace, bins):
+    # onto the fixed bins, longer traces keep the maximum of every bin, so narrow peaks do not fall between rows
+    n = len(trace)
+    if n <= len(bins):
+        return np.interp(bins, np.linspace(0, 1, n), trace)
+    edges = (np.arange(len(bins)) * n) // len(bins)
+    return np.maximum.reduceat(trace, edges)